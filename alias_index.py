@@ -0,0 +1,186 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from metrics import METRICS
+from simbad_cache import normalize_identifier
+
+# Shared by every survey and run, next to the Simbad cache
+ALIAS_PATH = os.environ.get('SIMBAD_ALIASES',
+                            os.path.join(os.path.dirname(__file__), 'query_results', 'simbad_aliases.sqlite'))
+CELL_ARCSEC = 1.  # Size of the position cells
+POSITION_TOLERANCE = 1.  # arcsec; positions closer than this to a known one are the same object
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS identifiers (
+    key     TEXT PRIMARY KEY,
+    main_id TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    cell    TEXT NOT NULL,
+    ra      REAL NOT NULL,
+    dec     REAL NOT NULL,
+    main_id TEXT NOT NULL,
+    sep     REAL NOT NULL,
+    PRIMARY KEY (cell, main_id)
+);
+"""
+
+
+def alias_key(identifier):
+    """
+    Key of an identifier form: normalized like the cache keys, with "2MASS J04141188+2811535"
+    and "2MASS 04141188+2811535" (the form the catalogs use) sharing one key.
+    """
+    return re.sub(r'^2MASS J(?=\d)', '2MASS ', normalize_identifier(identifier))
+
+
+def _columns(row):
+    # Number of cells around the sky in a row, so that cells are about CELL_ARCSEC wide on the sky
+    dec = min(90., abs(row + 0.5) * CELL_ARCSEC / 3600.)
+    return max(1, math.floor(1296000. * math.cos(math.radians(dec)) / CELL_ARCSEC))
+
+
+def _cell(ra_deg, dec_deg):
+    row = math.floor(dec_deg * 3600. / CELL_ARCSEC)
+    columns = _columns(row)
+    return f"{row}:{math.floor(ra_deg % 360. / 360. * columns) % columns}"
+
+
+def _neighbour_cells(ra_deg, dec_deg):
+    # The cell of a position and every cell touching it, in the rows above and below too
+    cells = []
+    center = math.floor(dec_deg * 3600. / CELL_ARCSEC)
+    for row in (center - 1, center, center + 1):
+        columns = _columns(row)
+        column = math.floor(ra_deg % 360. / 360. * columns)
+        cells += [f"{row}:{(column + offset) % columns}" for offset in (-1, 0, 1)]
+    return cells
+
+
+def _separation(ra1, dec1, ra2, dec2):
+    # Haversine, in arcsec
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    h = math.sin((dec2 - dec1) / 2) ** 2 + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2
+    return math.degrees(2 * math.asin(min(1., math.sqrt(h)))) * 3600.
+
+
+class AliasIndex:
+    """
+    Persistent SQLite index from every form an object was seen under to its canonical Simbad
+    main_id: identifiers (as keys of alias_key) and positions (hashed into ~1" cells).
+    Lookups are primary-key reads, so the cost does not grow with the number of surveys indexed.
+    Each position keeps how far from it its object was found, so a match made with a wide radius
+    is not handed out to a lookup with a narrower one.
+    Only positive answers are stored; "not found" stays with the SimbadCache, which expires it.
+    """
+
+    def __init__(self, path=ALIAS_PATH, tolerance=POSITION_TOLERANCE):
+        """
+        :param path: SQLite file, created if missing.
+        :param tolerance: Maximum separation in arcsec for a position to match a known one.
+            It must not exceed CELL_ARCSEC, since only the neighbouring cells are searched.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.tolerance = min(tolerance, CELL_ARCSEC)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(positions)")]
+        if columns and 'sep' not in columns:
+            # Positions recorded before separations were kept may come from any radius
+            self._conn.execute("DROP TABLE positions")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def lookup(self, identifier):
+        """
+        Canonical main_id of an identifier, or None if it was never resolved.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT main_id FROM identifiers WHERE key = ?",
+                                     (alias_key(identifier),)).fetchone()
+        METRICS.count('aliases.hits' if row else 'aliases.misses')
+        return None if row is None else row[0]
+
+    def lookup_position(self, ra_deg, dec_deg, radius):
+        """
+        main_id of the nearest known position within the tolerance, or None. Only positions whose
+        object is sure to lie within `radius` of (ra_deg, dec_deg) are considered.
+        :param radius: Match radius of the lookup, in arcsec.
+        """
+        cells = _neighbour_cells(ra_deg, dec_deg)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT ra, dec, main_id, sep FROM positions WHERE cell IN "
+                                      f"({', '.join('?' * len(cells))})", cells).fetchall()
+        best, best_sep = None, self.tolerance
+        for ra, dec, main_id, object_sep in rows:
+            sep = _separation(ra_deg, dec_deg, ra, dec)
+            if sep <= best_sep and sep + object_sep <= radius:
+                best, best_sep = main_id, sep
+        METRICS.count('aliases.hits' if best else 'aliases.misses')
+        return best
+
+    def add(self, aliases):
+        """
+        Record identifier forms.
+        :param aliases: Iterable of (identifier, main_id). The main_id is always recorded as an
+            alias of itself too.
+        """
+        now = time.time()
+        rows = []
+        for identifier, main_id in aliases:
+            main_id = str(main_id).strip()
+            rows += [(alias_key(identifier), main_id, now), (alias_key(main_id), main_id, now)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO identifiers VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def add_positions(self, positions):
+        """
+        Record positions.
+        :param positions: Iterable of (ra_deg, dec_deg, main_id, sep): catalog positions resolved to
+            an object sep arcsec away, or the object's own Simbad position with a sep of 0.
+        """
+        rows = [(_cell(ra, dec), float(ra), float(dec), str(main_id).strip(), float(sep))
+                for ra, dec, main_id, sep in positions]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        self.add((main_id, main_id) for _, _, _, main_id, _ in rows)
+
+    def clear(self):
+        """
+        Drop every alias.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM identifiers")
+            self._conn.execute("DELETE FROM positions")
+            self._conn.commit()
+
+
+_default_index = None
+
+
+def default_index():
+    """
+    The alias index shared by all scripts, opened on first use.
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = AliasIndex()
+    return _default_index
+
+
+def resolve_index(aliases):
+    """
+    Turn an `aliases` argument into an index: None means the shared default, False disables it.
+    """
+    if aliases is None:
+        return default_index()
+    return aliases or None
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from catalog_cache import file_digest
+
+# Outcomes that count as finished; errors and timeouts are queried again on a rerun
+DONE_OUTCOMES = ('found', 'empty')
+
+
+def run_directory(base_dir, file_path, optional_tag=None):
+    """
+    Directory holding the streamed results and journal of one input file + tag, so that a rerun
+    with the same input and tag picks up where the last one stopped. The file's contents are part
+    of the key, so an edited list starts a new run.
+    :param base_dir: Parent directory, e.g. query_results/archive_query/runs.
+    :param file_path: Input file of the run.
+    :param optional_tag: Tag given on the command line, if any.
+    :return: Path of the run directory.
+    """
+    key = f"{os.path.abspath(file_path)}|{file_digest(file_path)}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:8]
+    stem = optional_tag or os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(base_dir, f"{stem}_{digest}")
+
+
+class ResultJournal:
+    """
+    Writes each archive result to disk as soon as it arrives and keeps a journal of what is done.
+
+    Per archive, the rows go to `<archive>_results.txt` in the same layout as the final results
+    file, in completion order. `journal.jsonl` gets one line per finished query, written after the
+    rows and giving where they are, so a crash can at worst repeat the object that was being
+    written. A run that finished every query leaves a `complete` marker.
+    """
+
+    def __init__(self, run_dir, resume=True, reuse_complete=False):
+        """
+        :param run_dir: Directory of the run, see run_directory.
+        :param resume: Keep what a previous, interrupted run with this directory already wrote.
+            If False, start over.
+        :param reuse_complete: Also keep the results of a previous run that completed, instead of
+            querying everything again.
+        """
+        self.complete_path = os.path.join(run_dir, 'complete')
+        if os.path.exists(run_dir) and (not resume or (os.path.exists(self.complete_path) and not reuse_complete)):
+            shutil.rmtree(run_dir)
+        os.makedirs(run_dir, exist_ok=True)
+        self.run_dir = run_dir
+        self.journal_path = os.path.join(run_dir, 'journal.jsonl')
+        self._lock = threading.Lock()
+        self.outcomes = {}
+        self.blocks = {}  # (archive, object) -> (offset, length) of its rows in the archive's file
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Half-written last line of an interrupted run
+                    self.outcomes[(entry['archive'], entry['object'])] = entry['outcome']
+                    if 'offset' in entry:
+                        self.blocks[(entry['archive'], entry['object'])] = (entry['offset'], entry['length'])
+        self._journal = open(self.journal_path, 'a')
+
+    def done(self):
+        """
+        Set of (archive name, object name) that do not need to be queried again.
+        """
+        return {key for key, outcome in self.outcomes.items() if outcome in DONE_OUTCOMES}
+
+    def results_path(self, archive_name):
+        return os.path.join(self.run_dir, f"{archive_name}_results.txt")
+
+    def record(self, archive_name, object_name, result, outcome):
+        """
+        Append the rows of one result and mark the query as finished. Safe to call from worker threads.
+        :param archive_name: Archive label.
+        :param object_name: Object that was queried.
+        :param result: Table of results, or None.
+        :param outcome: 'found', 'empty', 'errors' or 'timeouts'.
+        """
+        with self._lock:
+            entry = {'archive': archive_name, 'object': object_name, 'outcome': outcome}
+            if outcome in DONE_OUTCOMES:
+                lines = [f"{object_name}:\n"]
+                lines += [f"\t{row}\n" for row in result] if result else ["\tNo data found.\n"]
+                block = ''.join(lines).encode()
+                with open(self.results_path(archive_name), 'ab') as f:
+                    entry.update(offset=f.tell(), length=len(block))
+                    f.write(block)
+                self.blocks[(archive_name, object_name)] = (entry['offset'], entry['length'])
+            self._journal.write(json.dumps(entry) + '\n')
+            self._journal.flush()
+            self.outcomes[(archive_name, object_name)] = outcome
+
+    def write_results(self, filename, archive_names, object_names):
+        """
+        Gather the per-archive files into one results file, with the objects of the input in input
+        order. Blocks are copied one object at a time, so nothing else is held in memory.
+        """
+        with open(filename, 'wb') as f:
+            for n, archive_name in enumerate(archive_names):
+                f.write((("\n\n" if n else "") + f"{archive_name} Results:\n").encode())
+                if not os.path.exists(self.results_path(archive_name)):
+                    continue
+                with open(self.results_path(archive_name), 'rb') as part:
+                    for object_name in dict.fromkeys(object_names):
+                        block = self.blocks.get((archive_name, object_name))
+                        if block is not None:
+                            part.seek(block[0])
+                            f.write(part.read(block[1]))
+
+    def no_data_objects(self, object_names, archive_names):
+        """
+        Objects without data in any of the archives (errors and timeouts count as no data).
+        """
+        return [obj_name for obj_name in object_names
+                if all(self.outcomes.get((archive_name, obj_name)) != 'found' for archive_name in archive_names)]
+
+    def mark_complete(self, object_names, archive_names):
+        """
+        Leave the completion marker if every query of the run is done, so that the next run with
+        the same input starts over instead of returning these results again.
+        :return: Whether the run is complete.
+        """
+        done = self.done()
+        complete = all((archive_name, object_name) in done
+                       for archive_name in archive_names for object_name in object_names)
+        if complete:
+            with open(self.complete_path, 'w'):
+                pass
+        return complete
+
+    def close(self):
+        self._journal.close()
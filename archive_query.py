@@ -3,6 +3,39 @@ from astroquery.eso import Eso
 from astroquery.gemini import Observations
 from datetime import datetime
 import csv
+from archive_scheduler import Archive, run_archives
+from archive_journal import ResultJournal, run_directory
+from metrics import METRICS
+from request_executor import ESO, GEMINI
+
+
+def query_sphere_object(object_name):
+    """
+    Query the VLT/SPHERE archive for one object.
+    :param object_name: Astronomical object name.
+    :return: Table of SPHERE observations, or None.
+    """
+    # Query ESO archive for SPHERE instrument
+    return ESO.call(Eso.query_instrument, 'sphere', target=object_name, operation='query_instrument')
+
+
+def query_gpi_object(object_name):
+    """
+    Query the Gemini Planet Imager archive for one object.
+    :param object_name: Astronomical object name.
+    :return: Table of GPI observations, or None.
+    """
+    # Query Gemini archive for GPI instrument
+    return GEMINI.call(Observations.query_criteria, instrument='GPI', objectname=object_name,
+                       operation='query_criteria')
+
+
+# Archives queried by main, all at the same time. Each gets its own concurrency limit; timeouts
+# and retries are handled per request by the ESO and GEMINI executors. Add an Archive here to
+# cover another instrument.
+SPHERE = Archive('SPHERE', query_sphere_object, max_workers=4, timeout=None)
+GPI = Archive('GPI', query_gpi_object, max_workers=4, timeout=None)
+ARCHIVES = [SPHERE, GPI]
 
 
 def query_sphere(object_names):
@@ -11,23 +44,8 @@ def query_sphere(object_names):
     :param object_names: List of astronomical object names.
     :return: Dictionary of query results.
     """
-    results = {}
-    for object_name in object_names:
-        try:
-            # Query ESO archive for SPHERE instrument
-            result = Eso.query_instrument('sphere', target=object_name)
-
-            if result is None or len(result) == 0:
-                print(f"No data found for {object_name}")
-                results[object_name] = None
-            else:
-                print(f"Found {len(result)} SPHERE results for {object_name}")
-                results[object_name] = result
-
-        except Exception as e:
-            print(f"Error querying {object_name}: {e}")
-            results[object_name] = None
-    return results
+    results, _ = run_archives(object_names, [SPHERE])
+    return results['SPHERE']
 
 
 def query_gpi(object_names):
@@ -36,30 +54,19 @@ def query_gpi(object_names):
     :param object_names: List of astronomical object names.
     :return: Dictionary of query results.
     """
-    results = {}
-    for object_name in object_names:
-        try:
-            # Query Gemini archive for GPI instrument
-            result = Observations.query_criteria(instrument='GPI',
-                                                 objectname=object_name)
-
-            if result is None or len(result) == 0:
-                print(f"No data found for {object_name}")
-                results[object_name] = None
-            else:
-                print(f"Found {len(result)} GPI results for {object_name}")
-                results[object_name] = result
-
-        except Exception as e:
-            print(f"Error querying {object_name}: {e}")
-            results[object_name] = None
-    return results
-
-
-def main(file_path, optional_tag=None):
+    results, _ = run_archives(object_names, [GPI])
+    return results['GPI']
+
+
+def main(file_path, optional_tag=None, resume=True, reuse_complete=False):
     """
     Main function to query the archives for objects listed in a file.
     :param file_path: Path to the file containing object names.
+    :param optional_tag: Tag added to the output file names.
+    :param resume: Skip objects already done by an earlier, interrupted run with the same file
+        contents and tag.
+    :param reuse_complete: Also reuse the results of an earlier run that completed, instead of
+        querying the archives again.
     """
 
     if not os.path.exists(file_path):
@@ -89,41 +96,41 @@ def main(file_path, optional_tag=None):
         return
     print(object_names)
 
+    # Results are streamed to a per-run directory as each query finishes, and journaled so that
+    # a rerun of an interrupted run with the same file and tag only queries what is left
+    now = datetime.now().strftime("%Y%m%d_%H%M%S")
+    date = datetime.now().strftime("%Y%m%d")
+    runs_dir = os.path.join(os.path.dirname(__file__), 'query_results', 'archive_query', 'runs')
+    journal = ResultJournal(run_directory(runs_dir, file_path, optional_tag), resume=resume,
+                            reuse_complete=reuse_complete)
+    done = journal.done()
+    if done:
+        print(f"Resuming: {len(done)} archive queries already done in {journal.run_dir}")
+
     print("Querying archives for objects...")
-    sphere_results = query_sphere(object_names)
-    gpi_results = query_gpi(object_names)
+    # SPHERE and GPI are independent services, so they are queried concurrently
+    METRICS.reset()
+    try:
+        run_archives(object_names, ARCHIVES, on_result=journal.record, skip=done, keep_results=False)
+    finally:
+        journal.close()
+        METRICS.write_report(f"archive_query_{optional_tag}" if optional_tag else "archive_query")
 
     # Save the results in a text file
-    now = datetime.now().strftime("%Y%m%d_%H%M%S")
-    date = datetime.now().strftime("%Y%m%d")
+    archive_names = [archive.name for archive in ARCHIVES]
+    if not journal.mark_complete(object_names, archive_names):
+        print(f"Some queries failed, rerun with the same file and tag to retry them ({journal.run_dir})")
     query_dir = os.path.join(os.path.dirname(__file__), 'query_results','archive_query',date)
     os.makedirs(query_dir, exist_ok=True)
-    with open(os.path.join(query_dir, f"archive_query_results_{now}.txt"), "w") as f:
-        f.write("SPHERE Results:\n")
-        for obj_name, result in sphere_results.items():
-            f.write(f"{obj_name}:\n")
-            if result:
-                for row in result:
-                    f.write(f"\t{row}\n")
-            else:
-                f.write("\tNo data found.\n")
-
-        f.write("\n\nGPI Results:\n")
-        for obj_name, result in gpi_results.items():
-            f.write(f"{obj_name}:\n")
-            if result:
-                for row in result:
-                    f.write(f"\t{row}\n")
-            else:
-                f.write("\tNo data found.\n")
-    # Save the list of objects with no data found in both SPHERE and GPI
-    no_data_objects = [obj_name for obj_name in object_names if
-                       sphere_results.get(obj_name) is None and
-                       gpi_results.get(obj_name) is None]
+    journal.write_results(os.path.join(query_dir, f"archive_query_results_{now}.txt"), archive_names,
+                          object_names)
+    # Save the list of objects with no data found in any of the archives
+    no_data_set = set(journal.no_data_objects(object_names, archive_names))
+    no_data_objects = [obj_name for obj_name in object_names if obj_name in no_data_set]
     no_data_ra = [ra[i] for i in range(len(object_names))
-                  if object_names[i] in no_data_objects]
+                  if object_names[i] in no_data_set]
     no_data_dec = [dec[i] for i in range(len(object_names))
-                   if object_names[i] in no_data_objects]
+                   if object_names[i] in no_data_set]
 
     data_list_dir = os.path.join(os.path.dirname(__file__), 'data_lists', date)
     os.makedirs(data_list_dir, exist_ok=True)
@@ -0,0 +1,168 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import METRICS, Progress
+
+
+class Archive:
+    """
+    One archive/instrument the scheduler can fan out to.
+    """
+
+    def __init__(self, name, query, max_workers=4, timeout=120):
+        """
+        :param name: Label used in the output, e.g. 'SPHERE'.
+        :param query: Function taking one object name and returning a table (or None if nothing found).
+        :param max_workers: Number of queries in flight against this archive at once.
+        :param timeout: Seconds after which a single query is given up on. None leaves it to the
+            query function, e.g. one going through a request_executor.RequestExecutor.
+        """
+        self.name = name
+        self.query = query
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+
+class ArchiveStats:
+    """
+    Per-archive counters for the throughput report.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.found = 0
+        self.empty = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.busy_time = 0.
+        self.start = None
+        self.end = None
+        self._lock = threading.Lock()
+
+    def record(self, outcome, elapsed):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.busy_time += elapsed
+            self.end = time.monotonic()
+
+    @property
+    def total(self):
+        return self.found + self.empty + self.errors + self.timeouts
+
+    def summary(self):
+        wall = (self.end or time.monotonic()) - self.start if self.start else 0.
+        rate = self.total / wall if wall > 0 else 0.
+        mean = self.busy_time / self.total if self.total else 0.
+        return (f"{self.name}: {self.total} objects in {wall:.1f} s ({rate:.2f} objects/s, "
+                f"mean latency {mean:.1f} s) - {self.found} with data, {self.empty} empty, "
+                f"{self.errors} errors, {self.timeouts} timeouts")
+
+
+def call_with_timeout(function, args, timeout):
+    """
+    Run function(*args), raising TimeoutError if it takes longer than `timeout` seconds.
+    The stalled call is left to finish in a daemon thread so it never blocks the rest of the list.
+    A timeout of None runs the function directly.
+    """
+    if timeout is None:
+        return function(*args)
+    box = {}
+
+    def target():
+        try:
+            box['result'] = function(*args)
+        except Exception as e:
+            box['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"no answer after {timeout} s")
+    if 'error' in box:
+        raise box['error']
+    return box['result']
+
+
+def run_archives(object_names, archives, on_result=None, skip=(), keep_results=True):
+    """
+    Query every object against every archive, with all archives running at the same time and
+    each one limited to its own number of workers.
+    :param object_names: List of astronomical object names.
+    :param archives: List of Archive.
+    :param on_result: Optional callback(archive_name, object_name, result, outcome), called as soon
+        as a query finishes. result is None for no data, errors and timeouts; outcome is one of
+        'found', 'empty', 'errors', 'timeouts'.
+    :param skip: Set of (archive name, object name) that are already done and are not queried.
+    :param keep_results: Keep every result table in memory and return them. Set to False when
+        on_result already writes them out, so memory does not grow with the target list.
+    :return: (results, stats). results maps archive name to {object name: result or None}
+        (empty dicts if keep_results is False), stats maps archive name to ArchiveStats.
+    """
+    results = {archive.name: {} for archive in archives}
+    stats = {archive.name: ArchiveStats(archive.name) for archive in archives}
+    skip = set(skip)
+    progress = Progress(sum(1 for archive in archives for object_name in object_names
+                            if (archive.name, object_name) not in skip), 'archive queries')
+
+    def run_one(archive, object_name):
+        start = time.monotonic()
+        result = None
+        try:
+            result = call_with_timeout(archive.query, (object_name,), archive.timeout)
+            if result is None or len(result) == 0:
+                print(f"No {archive.name} data found for {object_name}")
+                result = None
+                outcome = 'empty'
+            else:
+                print(f"Found {len(result)} {archive.name} results for {object_name}")
+                outcome = 'found'
+        except TimeoutError as e:
+            print(f"Timeout querying {archive.name} for {object_name}: {e}")
+            outcome = 'timeouts'
+        except Exception as e:
+            print(f"Error querying {archive.name} for {object_name}: {e}")
+            outcome = 'errors'
+        stats[archive.name].record(outcome, time.monotonic() - start)
+        METRICS.count(f"archive.{archive.name}.{outcome}")
+        progress.update()
+        if keep_results:
+            results[archive.name][object_name] = result
+        if on_result is not None:
+            on_result(archive.name, object_name, result, outcome)
+
+    def dispatch(archive):
+        # Only a few queries per worker are queued at a time, so long target lists do not pile up futures
+        slots = threading.BoundedSemaphore(2 * archive.max_workers)
+        errors = []
+
+        def release(future):
+            slots.release()
+            if future.exception() is not None:
+                errors.append(future.exception())
+
+        stats[archive.name].start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=archive.max_workers, thread_name_prefix=archive.name) as executor:
+            for object_name in object_names:
+                if (archive.name, object_name) in skip:
+                    continue
+                slots.acquire()
+                executor.submit(run_one, archive, object_name).add_done_callback(release)
+        if errors:
+            raise errors[0]  # Surface bugs in on_result instead of swallowing them
+
+    with ThreadPoolExecutor(max_workers=len(archives)) as dispatchers:
+        for future in [dispatchers.submit(dispatch, archive) for archive in archives]:
+            future.result()
+    progress.close()
+
+    skipped = sum(1 for archive in archives for object_name in object_names if (archive.name, object_name) in skip)
+    print("\nArchive throughput:" + (f" ({skipped} queries already done, skipped)" if skipped else ""))
+    for archive in archives:
+        print("  " + stats[archive.name].summary())
+
+    if keep_results:
+        # Keep the input order, as the per-archive dicts were filled in completion order
+        results = {name: {object_name: archive_results.get(object_name) for object_name in object_names}
+                   for name, archive_results in results.items()}
+    return results, stats
@@ -0,0 +1,236 @@
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import astropy.units as u
+from astropy.time import Time
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+from matplotlib.colors import ListedColormap
+from matplotlib.pyplot import cm
+from visibility import altaz_grid
+
+# Background levels of the twilight/night shading: day, Sun below the horizon, Sun below -18 deg
+SHADE_CMAP = ListedColormap([(0, 0, 0, 0), '0.5', 'k'])
+
+
+def altitude_cube(coords, times, location, chunk_size=16):
+    """
+    Altitude of every target at every sample of every night, computed up front so that frames
+    only index into it.
+    :param coords: SkyCoord of shape (targets,).
+    :param times: astropy Time of shape (nights, samples).
+    :param location: EarthLocation of the site.
+    :param chunk_size: Targets transformed per call, to keep the intermediate arrays small.
+    :return: float32 array of altitudes in degrees, shape (nights, targets, samples).
+    """
+    cube = np.empty((times.shape[0], len(coords), times.shape[1]), dtype=np.float32)
+    for start in range(0, len(coords), chunk_size):
+        altaz = altaz_grid(coords[start:start + chunk_size], times, location)  # (chunk, nights, samples)
+        cube[:, start:start + chunk_size, :] = np.moveaxis(altaz.alt.to_value(u.deg), 0, 1)
+    return cube
+
+
+def shade_levels(sun_alt):
+    """
+    0 for day, 1 for twilight (Sun below the horizon), 2 for night (Sun below -18 deg).
+    """
+    return (sun_alt < 0).astype(np.int8) + (sun_alt < -18)
+
+
+def build_figure(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels,
+                 xlim=(-8, 8), blit=True, figsize=(14, 8)):
+    """
+    Figure and artists of the az/el plot. All artists are created once; each frame only swaps their data.
+    :param dates: Sequence of dates (one per night) used for the frame title.
+    :param delta_midnight: Hours from local midnight, shape (samples,).
+    :param sun_alt: Sun altitude in degrees, shape (nights, samples).
+    :param moon_alt: Moon altitude in degrees, shape (nights, samples).
+    :param target_alt: Target altitudes in degrees, shape (nights, targets, samples), see altitude_cube.
+    :param labels: Target names, one per target.
+    :param xlim: Plotted range in hours from midnight.
+    :param blit: Mark the changing artists as animated, for blitting.
+    :param figsize: Figure size.
+    :return: (fig, update). update(frame) sets the artists to a night and returns them.
+    """
+    delta_midnight = np.asarray(delta_midnight)
+    fig = plt.figure(figsize=figsize)
+    ax = fig.add_subplot(111)
+    ax.set_xlabel('Hours from HST Midnight')
+    ax.set_ylabel('Altitude [deg]')
+    ax.set_xlim(*xlim)
+    ax.set_xticks(np.arange(xlim[0], xlim[1] + 1, 2))
+    ax.set_ylim(0, 90)
+
+    # Twilight and night shading as a one-row image, updated in place
+    shade = ax.imshow(shade_levels(sun_alt[0])[np.newaxis, :], cmap=SHADE_CMAP, vmin=0, vmax=2,
+                      extent=(delta_midnight[0], delta_midnight[-1], 0, 90), aspect='auto',
+                      interpolation='nearest', zorder=0, animated=blit)
+
+    # Sun and Moon
+    sun_line, = ax.plot(delta_midnight, sun_alt[0], lw=2, color='orange', ls='--', label='Sun', animated=blit)
+    moon_line, = ax.plot(delta_midnight, moon_alt[0], lw=2, color='white', alpha=0.5, ls='--', label='Moon',
+                         animated=blit)
+
+    # Each source
+    color = cm.magma(np.linspace(0.4, 1, len(labels)))
+    target_lines = [ax.plot(delta_midnight, target_alt[0, i], label=s, ls='--', color=color[i], animated=blit)[0]
+                    for i, s in enumerate(labels)]
+
+    # Date inside the axes, so it is part of the blitted region
+    title = ax.text(0.5, 0.97, '', transform=ax.transAxes, ha='center', va='top', fontsize=14,
+                    color='w', animated=blit)
+
+    legend = ax.legend(loc='upper left', frameon=1)
+    legend.get_frame().set_facecolor('gray')
+
+    artists = [shade, sun_line, moon_line, *target_lines, title]
+
+    def update(frame):
+        shade.set_data(shade_levels(sun_alt[frame])[np.newaxis, :])
+        sun_line.set_ydata(sun_alt[frame])
+        moon_line.set_ydata(moon_alt[frame])
+        for line, alt in zip(target_lines, target_alt[frame]):
+            line.set_ydata(alt)
+        title.set_text(dates[frame].strftime('%Y-%m-%d'))
+        return artists
+
+    return fig, update
+
+
+def build_animation(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels,
+                    xlim=(-8, 8), blit=True, figsize=(14, 8)):
+    """
+    Az/el animation over nights, see build_figure for the parameters.
+    :param blit: Only redraw the changing artists.
+    :return: (fig, animation, update). update(frame) sets the artists to a night and returns them.
+    """
+    fig, update = build_figure(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels,
+                               xlim=xlim, blit=blit, figsize=figsize)
+    animation = FuncAnimation(fig, update, frames=len(dates), init_func=lambda: update(0),
+                              blit=blit, repeat=False)
+    return fig, animation, update
+
+
+_worker_state = {}
+
+
+def _init_worker(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels, dpi):
+    # Each worker builds its own figure once and reuses it for every frame it renders. No
+    # FuncAnimation: frames are saved directly, and an unused one warns when it is garbage collected
+    matplotlib.use('Agg')
+    fig, update = build_figure(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels, blit=False)
+    _worker_state.update(fig=fig, update=update, dpi=dpi)
+
+
+def _render_frames(frames, frame_dir):
+    for frame in frames:
+        _worker_state['update'](frame)
+        _worker_state['fig'].savefig(os.path.join(frame_dir, f"frame_{frame:05d}.png"), dpi=_worker_state['dpi'])
+    return len(frames)
+
+
+def render_frames(frame_dir, dates, delta_midnight, sun_alt, moon_alt, target_alt, labels,
+                  max_workers=None, frames_per_task=1, dpi=100):
+    """
+    Render every night to a numbered PNG (frame_00000.png, ...) with a pool of processes.
+    Frames go straight to disk, so memory stays at one figure per worker however long the range is.
+    :param frame_dir: Output directory, created if needed. Frames left there by an earlier run are removed.
+    :param max_workers: Number of processes. Default is the number of CPUs.
+    :param frames_per_task: Frames handed to a worker at a time. Progress is reported per task, so the default
+                            of 1 reports every frame; a frame takes far longer to save than to dispatch.
+    :param dpi: Resolution of the PNGs.
+    The other parameters are the same as for build_figure.
+    :return: Number of frames written.
+    """
+    os.makedirs(frame_dir, exist_ok=True)
+    # A shorter range would otherwise leave the earlier run's last frames behind for the encoder to pick up
+    for stale in glob.glob(os.path.join(frame_dir, 'frame_*.png')):
+        os.remove(stale)
+    n_frames = len(dates)
+    chunks = [range(start, min(start + frames_per_task, n_frames)) for start in range(0, n_frames, frames_per_task)]
+    labels = list(labels)
+    start_time = time.monotonic()
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(dates, delta_midnight, sun_alt, moon_alt, target_alt, labels, dpi)) as pool:
+        futures = [pool.submit(_render_frames, chunk, frame_dir) for chunk in chunks]
+        for future in as_completed(futures):
+            done += future.result()
+            elapsed = time.monotonic() - start_time
+            print(f"\rRendered {done}/{n_frames} frames ({done / elapsed:.1f} frames/s)", end='', flush=True)
+    print()
+    return done
+
+
+def encode_frames(frame_dir, output, fps=10, n_frames=None):
+    """
+    Encode numbered PNG frames into an MP4 or GIF with ffmpeg, which streams them from disk.
+    :param frame_dir: Directory holding frame_00000.png, frame_00001.png, ...
+    :param output: Output file; the extension (.mp4 or .gif) selects the format.
+    :param fps: Frames per second.
+    :param n_frames: Only encode the first n_frames frames. Default is every numbered frame in frame_dir.
+    """
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError(f"ffmpeg not found; the PNG frames are in {frame_dir}")
+    pattern = os.path.join(frame_dir, 'frame_%05d.png')
+    if output.endswith('.gif'):
+        codec = ['-vf', 'split[a][b];[a]palettegen[p];[b][p]paletteuse']
+    else:
+        codec = ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    limit = [] if n_frames is None else ['-frames:v', str(n_frames)]
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', pattern, *codec, *limit,
+                    output], check=True)
+    print(f"Animation saved to '{output}'")
+
+
+def main():
+    # Headless export, e.g.
+    # python azel_animation.py disk_survey_data/S25B-Targets.csv --start 2025-08-01 --end 2026-01-31 -o S25B.mp4
+    matplotlib.use('Agg')
+    from astropy.coordinates import EarthLocation
+    from ephemeris import sun_moon_altaz
+    from visibility import target_coords
+
+    parser = argparse.ArgumentParser(description='Render the az/el animation of a target list to PNG frames, MP4 or GIF.')
+    parser.add_argument('targets', help='CSV file with Target, RA and Decl columns (degrees)')
+    parser.add_argument('--start', required=True, help='First night, e.g. 2025-08-01')
+    parser.add_argument('--end', required=True, help='Last night, e.g. 2026-01-31')
+    parser.add_argument('--site', default='Subaru', help='Site name for EarthLocation.of_site')
+    parser.add_argument('--utcoffset', type=float, default=-10, help='Local time minus UT in hours')
+    parser.add_argument('--samples', type=int, default=1000, help='Samples per night')
+    parser.add_argument('-o', '--output', default='azel.mp4', help='.mp4, .gif, or a directory for PNG frames only')
+    parser.add_argument('--frame-dir', default=None, help='Where to write the PNG frames (default: next to the output)')
+    parser.add_argument('--workers', type=int, default=None, help='Number of rendering processes')
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args()
+
+    sourcelist = pd.read_csv(args.targets)
+    coords = target_coords(sourcelist['RA'], sourcelist['Decl'])
+    location = EarthLocation.of_site(args.site)
+    utcoffset = args.utcoffset * u.hour
+
+    ephem = sun_moon_altaz(args.site, args.start, args.end, utcoffset=utcoffset, samples=args.samples)
+    dates = pd.date_range(start=args.start, end=args.end, freq='D')
+    midnights = Time(dates) - utcoffset
+    night_times = midnights[:, np.newaxis] + (ephem['delta_midnight'] * u.hour)[np.newaxis, :]
+    print(f"Computing altitudes of {len(coords)} targets over {len(dates)} nights...")
+    target_alt = altitude_cube(coords, night_times, location)
+
+    video = args.output.endswith(('.mp4', '.gif'))
+    frame_dir = args.frame_dir or (os.path.splitext(args.output)[0] + '_frames' if video else args.output)
+    n_frames = render_frames(frame_dir, dates, ephem['delta_midnight'], ephem['sun_alt'], ephem['moon_alt'], target_alt,
+                             sourcelist['Target'], max_workers=args.workers, dpi=args.dpi)
+    if video:
+        encode_frames(frame_dir, args.output, fps=args.fps, n_frames=n_frames)
+
+
+if __name__ == "__main__":
+    main()
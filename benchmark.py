@@ -0,0 +1,192 @@
+import argparse
+import copy
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# e.g. python benchmark.py --size 2000 --latency 0.3 --error-rate 0.02 --json bench.json
+#      python benchmark.py --baseline bench.json   (exits with 1 if a case got slower than the tolerance)
+#      python benchmark.py --smoke   (every case on 5 targets, exits with 1 if any of them had a failure)
+
+CASES = ('get_info', 'crossmatch', 'cone', 'archive', 'survey:soda', 'survey:taurus_classII')
+
+
+def synthetic_targets(size):
+    """
+    Deterministic 2MASS-style names and positions spread over the sky.
+    """
+    names, ra, dec = [], [], []
+    for i in range(size):
+        ra.append((i * 137.50776) % 360.)
+        dec.append(-80. + (i * 61.803) % 160.)
+        names.append(f"2MASS J{i:08d}+{size - i:07d}")
+    return names, ra, dec
+
+
+def run_case(case, server, size, cone_rate, scratch):
+    """
+    Run one benchmark case against the stand-in. Imports are deferred so that the caches are
+    already pointed at the scratch directory. Each case's work returns (targets, failed), failed
+    being the targets the client got no answer for (an exception or a None result); every
+    synthetic target exists, so these are errors just like the ones the stand-in injected.
+    :return: Dictionary of metrics.
+    """
+    import astropy.units as u
+    names, ra, dec = synthetic_targets(size)
+    tap_url = f"{server.url}/simbad/simbad/sim-tap"
+
+    if case == 'get_info':
+        from query_objects import get_info
+
+        def work():
+            results = get_info(names, 'main_id', 'G', 'J', 'H', 'K', save_tsv=False, cache=False, aliases=False)
+            return size, results['main_id'].count(None)
+    elif case == 'crossmatch':
+        from simbad_xmatch import crossmatch_positions
+
+        def work():
+            matches = crossmatch_positions(ra, dec, unit=(u.deg, u.deg), tap_url=tap_url, cache=False, aliases=False)
+            return size, matches['main_id'].count(None)
+    elif case == 'cone':
+        from simbad_resolver import resolve_positions
+
+        def work():
+            resolved = resolve_positions(ra, dec, unit=(u.deg, u.deg), rate=cone_rate, cache=False, aliases=False)
+            return size, resolved.count(None)
+    elif case == 'archive':
+        from archive_query import ARCHIVES
+        from archive_scheduler import run_archives
+
+        def work():
+            # No data is a normal answer of the archives, only errors and timeouts are failures
+            _, stats = run_archives(names, ARCHIVES, keep_results=False)
+            return size, sum(archive.errors + archive.timeouts for archive in stats.values())
+    elif case.startswith('survey:'):
+        import simbad_xmatch
+        from pipeline import run_stages
+        from survey_pipeline import SURVEYS
+        simbad_xmatch.SIMBAD_TAP_URL = tap_url
+        survey = copy.copy(SURVEYS[case.split(':', 1)[1]])
+        survey.output = os.path.join(scratch, f"{survey.name}_rev.txt")
+        survey.failed_queries = os.path.join(scratch, f"failed_queries_{survey.name}.txt")
+        parameters = {parameter: {'G_limit': 12., 'H_limit': 10.}[parameter] for parameter in survey.parameters()}
+
+        def work():
+            # The survey's own catalog, so the row count is the catalog's
+            rows = run_stages(survey.stages(**parameters), use_cache=False)
+            return len(rows['name']), len(rows['failed'])
+    else:
+        raise ValueError(f"Unknown case {case!r}, expected one of {CASES}")
+
+    before = server.stats_dict()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        rows, failed = work()
+    except Exception as e:
+        print(f"{case} failed: {e!r}")
+        rows, failed = size, size
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = server.stats_dict()
+
+    requests = sum(after[name]['requests'] - before[name]['requests'] for name in after)
+    server_errors = sum(after[name]['errors'] + after[name]['throttled']
+                        - before[name]['errors'] - before[name]['throttled'] for name in after)
+    answered = rows - failed
+    return {'case': case, 'size': rows, 'wall_s': wall, 'requests': requests,
+            'requests_per_s': requests / wall if wall else 0., 'rows_per_s': answered / wall if wall else 0.,
+            'errors': server_errors + failed, 'failed': failed, 'peak_python_mb': peak / 2 ** 20,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.}  # ru_maxrss is in kB on Linux
+
+
+def compare(results, baseline, tolerance):
+    """
+    Cases whose wall time grew by more than `tolerance` (fraction) over the baseline run.
+    """
+    previous = {result['case']: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result['case'])
+        if old and old['size'] == result['size'] and result['wall_s'] > old['wall_s'] * (1 + tolerance):
+            regressions.append(f"{result['case']}: {old['wall_s']:.2f} s -> {result['wall_s']:.2f} s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the resolve, photometry and archive paths '
+                                                 'against the local stand-in services.')
+    parser.add_argument('cases', nargs='*', default=list(CASES), help=f"Cases to run (default: {' '.join(CASES)})")
+    parser.add_argument('--size', type=int, default=1000, help='Number of synthetic targets per case')
+    parser.add_argument('--latency', type=float, default=0.1, help='Median stand-in latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Log-normal sigma of the latency')
+    parser.add_argument('--error-rate', type=float, default=0., help='Fraction of requests answered with 503')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='Per-service concurrency before 429s')
+    parser.add_argument('--cone-rate', type=float, default=50., help='Cone searches per second in the cone case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown over the baseline (fraction)')
+    parser.add_argument('--smoke', action='store_true',
+                        help='Smoke test: run every case with --size 5 and fail if any target got no answer')
+    args = parser.parse_args(argv)
+    if args.smoke:
+        args.cases, args.size = list(CASES), 5
+
+    # The shared caches must not hide the network paths nor be polluted by synthetic objects
+    scratch = tempfile.mkdtemp(prefix='get_targets_benchmark_')
+    os.environ['SIMBAD_CACHE'] = os.path.join(scratch, 'simbad_cache.sqlite')
+    os.environ['SIMBAD_ALIASES'] = os.path.join(scratch, 'simbad_aliases.sqlite')
+
+    from astroquery.eso import Eso
+    from astroquery.gemini import Observations
+    from astroquery.simbad import Simbad
+    from standin_server import ServiceBehaviour, StandinServer, reroute_session, SERVICES
+
+    # Every synthetic target exists, so a target left without an answer is a failure (see run_case)
+    behaviour = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     max_concurrent=args.max_concurrent, match_rate=1.)
+    server = StandinServer(('localhost', 0), {name: ServiceBehaviour(**behaviour) for name in SERVICES},
+                           seed=args.seed)
+    server.start()
+    for client, service in ((Simbad, 'simbad'), (Eso, 'eso'), (Observations, 'gemini')):
+        reroute_session(client._session, service, server.url)
+    print(f"Stand-in on {server.url}, latency {args.latency} s, error rate {args.error_rate}, scratch {scratch}")
+
+    results = []
+    for case in args.cases:
+        print(f"--- {case}")
+        results.append(run_case(case, server, args.size, args.cone_rate, scratch))
+    server.shutdown()
+
+    print(f"\n{'case':<24}{'wall s':>9}{'requests':>10}{'req/s':>9}{'rows/s':>10}{'errors':>8}{'failed':>8}"
+          f"{'peak MB':>9}{'RSS MB':>9}")
+    for result in results:
+        print(f"{result['case']:<24}{result['wall_s']:>9.2f}{result['requests']:>10}{result['requests_per_s']:>9.1f}"
+              f"{result['rows_per_s']:>10.1f}{result['errors']:>8}{result['failed']:>8}"
+              f"{result['peak_python_mb']:>9.1f}{result['max_rss_mb']:>9.1f}")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Slower than baseline: {regression}")
+        return 1 if regressions else 0
+    if args.smoke:
+        broken = [result['case'] for result in results if result['failed']]
+        for case in broken:
+            print(f"Smoke test failed: {case}")
+        return 1 if broken else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
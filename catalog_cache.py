@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import numpy as np
+from astropy.table import Table, MaskedColumn
+from metrics import METRICS
+from vizier_tsv import read_vizier_tsv
+
+CATALOG_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'query_results', 'catalogs')
+MANIFEST = 'manifest.json'
+
+
+def file_digest(filepath, block_size=1 << 20):
+    """
+    SHA-1 of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sidecar_dir(filepath, reader, columns, cache_dir):
+    # One sidecar per source file, reader and column selection
+    key = '|'.join([os.path.abspath(filepath), f"{reader.__module__}.{reader.__qualname__}",
+                    ','.join(columns) if columns is not None else '*'])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.basename(filepath)}_{digest}")
+
+
+def _save_array(path, array):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        np.save(file, array)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(sidecar, manifest):
+    tmp_path = os.path.join(sidecar, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp_path, os.path.join(sidecar, MANIFEST))
+
+
+def _write_sidecar(sidecar, table, source_stat, source_digest):
+    os.makedirs(sidecar, exist_ok=True)
+    # Column files are named after the source's contents, so a rebuild never overwrites the
+    # files an older manifest (maybe being read by another process) points to
+    build = source_digest[:12]
+    entries = []
+    for i, name in enumerate(table.colnames):
+        column = table[name]
+        data = np.ma.getdata(column)
+        if data.dtype == object:
+            data = data.astype(str)
+        mask = np.ma.getmaskarray(column)
+        entry = {'name': name, 'data': f"{build}_col{i:03d}.npy", 'mask': None,
+                 'unit': str(column.unit) if column.unit is not None else None,
+                 'description': column.description}
+        _save_array(os.path.join(sidecar, entry['data']), np.ascontiguousarray(data))
+        if mask.any():
+            entry['mask'] = f"{build}_col{i:03d}.mask.npy"
+            _save_array(os.path.join(sidecar, entry['mask']), mask)
+        entries.append(entry)
+
+    # The manifest is replaced last, so a sidecar is only ever read with its own column files
+    _write_manifest(sidecar, {'mtime_ns': source_stat.st_mtime_ns, 'size': source_stat.st_size,
+                              'sha1': source_digest, 'length': len(table), 'columns': entries})
+    current = {entry['data'] for entry in entries} | {entry['mask'] for entry in entries if entry['mask']}
+    for filename in os.listdir(sidecar):
+        if filename.endswith('.npy') and filename not in current:
+            try:
+                os.remove(os.path.join(sidecar, filename))
+            except OSError:
+                pass  # Removed by another process rebuilding the same sidecar
+
+
+def _read_manifest(sidecar):
+    try:
+        with open(os.path.join(sidecar, MANIFEST), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_sidecar(sidecar, manifest):
+    table = Table()
+    for entry in manifest['columns']:
+        data = np.load(os.path.join(sidecar, entry['data']), mmap_mode='r')
+        mask = np.load(os.path.join(sidecar, entry['mask']), mmap_mode='r') if entry['mask'] else False
+        table[entry['name']] = MaskedColumn(data, mask=mask, unit=entry['unit'],
+                                            description=entry['description'], copy=False)
+    return table
+
+
+def load_catalog(filepath, reader=read_vizier_tsv, columns=None, cache_dir=CATALOG_CACHE_DIR, use_cache=True):
+    """
+    Parse a survey catalog once and keep the result as a binary columnar sidecar: one .npy file
+    per column (plus a mask file where values are missing) and a manifest.json recording the
+    source file's mtime, size and SHA-1. Later loads memory-map the .npy files instead of parsing.
+    The sidecar is rebuilt when the source changes: a different size or hash invalidates it, a
+    different mtime alone triggers a hash check.
+    :param filepath: Path to the catalog, e.g. 'orion_sources.tsv'.
+    :param reader: Parser called as reader(filepath, columns=columns) returning an astropy Table,
+        e.g. read_vizier_tsv or cds_table.read_cds_table.
+    :param columns: Optional list of columns to keep, passed to the reader.
+    :param cache_dir: Directory of the sidecars.
+    :param use_cache: Set to False to always parse the source.
+    :return: astropy Table of MaskedColumns (memory-mapped, read-only when loaded from the sidecar).
+    """
+    if not use_cache:
+        return reader(filepath, columns=columns)
+
+    sidecar = _sidecar_dir(filepath, reader, columns, cache_dir)
+    source_stat = os.stat(filepath)
+    manifest = _read_manifest(sidecar)
+    source_digest = None
+    try:
+        if manifest is not None and manifest['size'] == source_stat.st_size:
+            if manifest['mtime_ns'] == source_stat.st_mtime_ns:
+                METRICS.count('catalog_cache.hits')
+                return _load_sidecar(sidecar, manifest)
+            # Touched but maybe not modified: compare contents before re-parsing
+            source_digest = file_digest(filepath)
+            if manifest['sha1'] == source_digest:
+                _write_manifest(sidecar, dict(manifest, mtime_ns=source_stat.st_mtime_ns))
+                METRICS.count('catalog_cache.hits')
+                return _load_sidecar(sidecar, manifest)
+    except FileNotFoundError:
+        pass  # Another process replaced the sidecar after the manifest was read: parse the source
+
+    METRICS.count('catalog_cache.misses')
+    table = reader(filepath, columns=columns)
+    _write_sidecar(sidecar, table, source_stat, source_digest or file_digest(filepath))
+    return table
+
@@ -0,0 +1,133 @@
+import mmap
+import re
+from collections import namedtuple
+import numpy as np
+from astropy.table import Table, MaskedColumn
+from vizier_tsv import _typed_column
+
+# "  83- 91 F9.6   deg      RAdeg     Right ascension (ICRS)" / " 343-343 A1 ..." / "  5  A1 ..."
+_BYTES_RE = re.compile(r'^\s*(?P<start>\d+)(?:\s*-\s*(?P<end>\d+))?\s+(?P<format>[A-Za-z])[0-9.]*\s+'
+                       r'(?P<unit>\S+)\s+(?P<label>\S+)\s*(?P<explanation>.*)$')
+_SEPARATOR_RE = re.compile(rb'^-{20,}\r?$', re.MULTILINE)
+
+CdsColumn = namedtuple('CdsColumn', ['start', 'end', 'format', 'unit', 'label', 'explanation'])
+
+
+def parse_byte_description(header):
+    """
+    Column layout from the "Byte-by-byte Description" block of a CDS/MRT header.
+    :param header: Header text (str), everything before the data.
+    :return: List of CdsColumn with 0-based start and exclusive end byte offsets.
+    """
+    columns = []
+    in_table = False
+    separators = 0
+    for line in header.splitlines():
+        if line.startswith('Byte-by-byte Description'):
+            in_table, separators = True, 0
+            continue
+        if not in_table:
+            continue
+        if line.startswith('---'):
+            separators += 1
+            if separators == 3:  # above / below the "Bytes Format ..." line, then end of the table
+                break
+            continue
+        match = _BYTES_RE.match(line)
+        if separators == 2 and match:
+            start = int(match['start'])
+            end = int(match['end'] or start)
+            unit = None if match['unit'] == '---' else match['unit']
+            columns.append(CdsColumn(start - 1, end, match['format'].upper(), unit, match['label'],
+                                     match['explanation'].strip()))
+    if not columns:
+        raise ValueError("No Byte-by-byte Description found")
+    return columns
+
+
+def _records(buffer, offset):
+    # Data lines as a (rows, bytes) uint8 array. Padded fixed-width files (the usual case) are
+    # viewed in place; ragged ones are padded with NUL bytes, which the 'S' views drop again.
+    data = np.frombuffer(buffer, dtype=np.uint8, offset=offset)
+    record_length = buffer.find(b'\n', offset) - offset + 1
+    if record_length > 0 and len(data) % record_length == 0 \
+            and (data[record_length - 1::record_length] == ord('\n')).all():
+        return data.reshape(len(data) // record_length, record_length)
+    lines = [line for line in bytes(data).splitlines() if line.strip()]
+    width = max(len(line) for line in lines)
+    return np.array(lines, dtype=f'S{width}').view(np.uint8).reshape(len(lines), width)
+
+
+def _column_values(records, column):
+    # Byte slice of every row as one fixed-width string array
+    end = min(column.end, records.shape[1])
+    width = end - column.start
+    if width <= 0:
+        return np.full(len(records), '')
+    raw = np.ascontiguousarray(records[:, column.start:end]).view(f'S{width}').ravel()
+    return np.char.decode(raw, 'ascii')
+
+
+def read_cds_table(filepath, columns=None):
+    """
+    Read a CDS/MRT fixed-width table (e.g. the Luhman Taurus members in taurus_sources.txt)
+    using its Byte-by-byte Description. The file is memory-mapped and each requested column is
+    cut out of all rows at once by its byte range, then typed from its format (I, F/E, A).
+    Blank fields, e.g. "? ..." optional values, are masked.
+    :param filepath: Path to the table.
+    :param columns: Optional list of labels to read, e.g. ['2MASS', 'RAdeg', 'DEdeg', 'Gmag'].
+    :return: astropy Table. The column explanations are in the column descriptions.
+    """
+    with open(filepath, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offset, by_label, wanted = _layout(buffer, columns, filepath)
+        records = _records(buffer, offset)
+        values = {label: _column_values(records, by_label[label]) for label in wanted}
+        del records  # release the buffer before the mmap is closed
+    return _build_table(values, by_label, wanted)
+
+
+def iter_cds_table(filepath, columns=None, batch_size=10000):
+    """
+    Read a CDS/MRT fixed-width table lazily, `batch_size` rows at a time. Fixed-width files are
+    sliced straight out of the memory map, so only the current batch is ever decoded.
+    :param filepath: Path to the table.
+    :param columns: Optional list of labels to read.
+    :param batch_size: Number of rows per table.
+    :return: Generator of astropy Tables.
+    """
+    with open(filepath, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        offset, by_label, wanted = _layout(buffer, columns, filepath)
+        records = _records(buffer, offset)
+        try:
+            for start in range(0, len(records), batch_size):
+                batch = records[start:start + batch_size]
+                yield _build_table({label: _column_values(batch, by_label[label]) for label in wanted},
+                                   by_label, wanted)
+                del batch
+        finally:
+            del records
+
+
+def _layout(buffer, columns, filepath):
+    # The data start after the last separator line of the header
+    separators = list(_SEPARATOR_RE.finditer(buffer))
+    if not separators:
+        raise ValueError(f"{filepath} has no CDS header")
+    offset = separators[-1].end() + 1
+    layout = parse_byte_description(buffer[:offset].decode('ascii', errors='replace'))
+
+    by_label = {column.label: column for column in layout}
+    wanted = [column.label for column in layout] if columns is None else columns
+    missing = [label for label in wanted if label not in by_label]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {filepath}")
+    return offset, by_label, wanted
+
+
+def _build_table(values, by_label, wanted):
+    table = Table()
+    for label in wanted:
+        column = by_label[label]
+        table[label] = MaskedColumn(_typed_column(values[label], column.format), unit=column.unit,
+                                    description=column.explanation)
+    return table
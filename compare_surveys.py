@@ -1,34 +1,23 @@
-import csv
-from astroquery.simbad import Simbad
-from astropy.coordinates import SkyCoord
-import astropy.units as u
 import os
 import numpy as np
+from crossmatch import crossmatch
+from catalog_cache import load_catalog
 
 # first import the survey data
 survey_dir = os.path.join(os.path.dirname(__file__), 'disk_survey_data')
-orion1 = os.path.join(survey_dir, 'SODA_I.tsv')
-taurus1 = os.path.join(survey_dir, 'Taurus_ClassII.tsv')
+orion1 = os.path.join(survey_dir, 'orion', 'SODA_I.tsv')
+taurus1 = os.path.join(survey_dir, 'taurus', 'Taurus_ClassII.tsv')
 
 
-def read_tsv_ignore_comments(filepath):
-    with open(filepath, 'r') as tsvfile:
-        tsvreader = csv.reader(tsvfile, delimiter='\t')
-        data = [row for row in tsvreader if row and not row[0].startswith('#')]  # Check if row is not empty
-    return data
-
-
-# read files in
-data_orion1 = read_tsv_ignore_comments(orion1)[3:]
-hd_orion1 = read_tsv_ignore_comments(orion1)[:3]
-data_taurus1 = read_tsv_ignore_comments(taurus1)[3:]
-hd_taurus1 = read_tsv_ignore_comments(taurus1)[:3]
+# read files in (parsed once, then loaded from the binary sidecar cache, only the columns used below)
+data_orion1 = load_catalog(orion1, columns=['_RAJ2000', '_DEJ2000'])
+data_taurus1 = load_catalog(taurus1, columns=['2MASS'])
 
 # Get relevant columns
 # Orion
-ra_orion, dec_orion = [row[0] for row in data_orion1], [row[1] for row in data_orion1]
+ra_orion, dec_orion = data_orion1['_RAJ2000'].tolist(), data_orion1['_DEJ2000'].tolist()
 # Taurus
-two_mass_names_taurus = [row[1] for row in data_taurus1]
+two_mass_names_taurus = data_taurus1['2MASS'].tolist()
 
 
 # Function to compare this list with the lists we have
@@ -49,12 +38,12 @@ taurus_data_names = [row.split()[1] for row in taurus_data]
 # Compare the lists
 common_taurus = set(two_mass_names_taurus).intersection(taurus_data_names)
 print(f"Common Taurus: {common_taurus}")
-# Ensure RA values are in .3f format
-ra_orion_formatted = [f"{float(ra):.3f}" for ra in ra_orion]
-orion_ra_formatted = [f"{float(ra):.3f}" for ra in orion_ra]
-# Find common elements
-common_orion = set(ra_orion_formatted).intersection(orion_ra_formatted)
-print(f"Common Orion: {common_orion}")
-
-# print(ra_orion_formatted)
-# print(orion_ra_formatted)
+# Match Orion by position (RA and Dec) within an angular tolerance, instead of comparing rounded RA strings
+match_tolerance = 1.0  # arcsec
+orion_match = crossmatch(np.array(ra_orion, dtype=float), np.array(dec_orion, dtype=float),
+                         np.array(orion_ra, dtype=float), np.array(orion_dec, dtype=float),
+                         tolerance=match_tolerance)
+common_orion = [(ra_orion[i], dec_orion[i]) for i in orion_match['idx1']]
+print(f"Common Orion ({len(common_orion)} within {match_tolerance}\"): {common_orion}")
+print(f"Separations [arcsec]: {np.round(orion_match['sep'], 3).tolist()}")
+print(f"Unmatched: {len(orion_match['unmatched1'])} SODA sources, {len(orion_match['unmatched2'])} no-data sources")
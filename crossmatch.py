@@ -0,0 +1,103 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def radec_to_unit(ra_deg, dec_deg):
+    """
+    Convert RA/Dec in degrees to unit vectors on the sphere.
+    :param ra_deg: Array of right ascensions in degrees.
+    :param dec_deg: Array of declinations in degrees.
+    :return: (N, 3) array of unit vectors.
+    """
+    ra = np.radians(np.asarray(ra_deg, dtype=float))
+    dec = np.radians(np.asarray(dec_deg, dtype=float))
+    cos_dec = np.cos(dec)
+    return np.column_stack((cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)))
+
+
+def chord_to_arcsec(chord):
+    """
+    Angular separation (arcsec) corresponding to a chord length between unit vectors.
+    """
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2, 0, 1))) * 3600.
+
+
+def arcsec_to_chord(sep_arcsec):
+    """
+    Chord length between unit vectors separated by `sep_arcsec`.
+    """
+    return 2 * np.sin(np.radians(sep_arcsec / 3600.) / 2)
+
+
+class SkyIndex:
+    """
+    KD-tree over the unit vectors of a catalog, built once and queried as often as needed.
+    Separations are exact on the sphere (no RA compression near the poles, no wrap at 0/360).
+    """
+
+    def __init__(self, ra_deg, dec_deg):
+        """
+        :param ra_deg: Array of right ascensions in degrees.
+        :param dec_deg: Array of declinations in degrees.
+        """
+        self.size = len(ra_deg)
+        self.tree = cKDTree(radec_to_unit(ra_deg, dec_deg))
+
+    def nearest(self, ra_deg, dec_deg, tolerance=1.):
+        """
+        Nearest catalog entry for each position, within `tolerance`.
+        :param ra_deg: Array of right ascensions in degrees.
+        :param dec_deg: Array of declinations in degrees.
+        :param tolerance: Maximum separation in arcsec.
+        :return: (index, sep) arrays. index is -1 and sep is NaN where nothing is within tolerance.
+        """
+        if self.size == 0 or len(ra_deg) == 0:
+            return np.full(len(ra_deg), -1), np.full(len(ra_deg), np.nan)
+        chord, index = self.tree.query(radec_to_unit(ra_deg, dec_deg), k=1,
+                                       distance_upper_bound=arcsec_to_chord(tolerance))
+        found = np.isfinite(chord)
+        index = np.where(found, index, -1)
+        sep = np.where(found, chord_to_arcsec(np.where(found, chord, 0)), np.nan)
+        return index, sep
+
+    def within(self, ra_deg, dec_deg, radius):
+        """
+        All catalog entries within `radius` of each position.
+        :param radius: Search radius in arcsec.
+        :return: List (one per position) of index arrays.
+        """
+        points = radec_to_unit(ra_deg, dec_deg)
+        return [np.asarray(found, dtype=int)
+                for found in self.tree.query_ball_point(points, arcsec_to_chord(radius))]
+
+
+def crossmatch(ra1, dec1, ra2, dec2, tolerance=1., unique=True):
+    """
+    Match catalog 1 against catalog 2 by position.
+    :param ra1: Right ascensions of catalog 1, in degrees.
+    :param dec1: Declinations of catalog 1, in degrees.
+    :param ra2: Right ascensions of catalog 2, in degrees.
+    :param dec2: Declinations of catalog 2, in degrees.
+    :param tolerance: Maximum separation in arcsec.
+    :param unique: If True, a catalog 2 source is paired with at most one catalog 1 source (the
+        closest); the others are reported as unmatched.
+    :return: Dictionary with
+        idx1, idx2: indices of the matched pairs,
+        sep: their separations in arcsec,
+        unmatched1, unmatched2: indices of the sources without a counterpart.
+    """
+    index, sep = SkyIndex(ra2, dec2).nearest(ra1, dec1, tolerance)
+    idx1 = np.flatnonzero(index >= 0)
+    idx2 = index[idx1]
+    sep = sep[idx1]
+
+    if unique and len(idx1):
+        # Closest pair first, then keep the first occurrence of every catalog 2 index
+        order = np.argsort(sep, kind='stable')
+        _, first = np.unique(idx2[order], return_index=True)
+        keep = np.sort(order[first])
+        idx1, idx2, sep = idx1[keep], idx2[keep], sep[keep]
+
+    unmatched1 = np.setdiff1d(np.arange(len(ra1)), idx1)
+    unmatched2 = np.setdiff1d(np.arange(len(ra2)), idx2)
+    return {'idx1': idx1, 'idx2': idx2, 'sep': sep, 'unmatched1': unmatched1, 'unmatched2': unmatched2}
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import astropy.units as u
+from astropy.time import Time
+from astropy.coordinates import EarthLocation, AltAz, get_sun, get_body
+
+EPHEMERIS_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'query_results', 'ephemeris')
+
+
+def night_grid(start, end, utcoffset=-10 * u.hour, samples=1000, span=24 * u.hour):
+    """
+    Time grid of `samples` times around local midnight for every night from start to end.
+    :param start: First date, e.g. '2025-08-01'.
+    :param end: Last date (inclusive).
+    :param utcoffset: Local time minus UT (-10 h for Hawaii).
+    :param samples: Number of samples per night.
+    :param span: Total time covered per night, centred on midnight.
+    :return: (dates, midnights, delta_midnight, times). times has shape (nights, samples).
+    """
+    dates = pd.date_range(start=start, end=end, freq='D')
+    midnights = Time(dates) - utcoffset
+    half = span.to(u.hour) / 2
+    delta_midnight = np.linspace(-half.value, half.value, samples) * u.hour
+    times = midnights[:, np.newaxis] + delta_midnight[np.newaxis, :]
+    return dates, midnights, delta_midnight, times
+
+
+def _cache_path(site, location, start, end, utcoffset, samples, span, cache_dir):
+    key = '|'.join(str(part) for part in (
+        site, location.lat.deg, location.lon.deg, location.height.to_value(u.m),
+        start, end, utcoffset.to_value(u.hour), samples, span.to_value(u.hour)))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    name = f"sun_moon_{str(site).replace(' ', '_')}_{start}_{end}_{samples}_{digest}.npz"
+    return os.path.join(cache_dir, name)
+
+
+def sun_moon_altaz(site, start, end, utcoffset=-10 * u.hour, samples=1000, span=24 * u.hour,
+                   cache_dir=EPHEMERIS_CACHE_DIR, use_cache=True):
+    """
+    Sun and Moon altitude/azimuth for every night of a date range, evaluated in one broadcast
+    transform over the nights x samples grid and cached on disk as a compressed .npz keyed by
+    site, date range and sampling.
+    :param site: Site name for EarthLocation.of_site (e.g. 'Subaru'), or an EarthLocation.
+    :param start: First date, e.g. '2025-08-01'.
+    :param end: Last date (inclusive).
+    :param utcoffset: Local time minus UT.
+    :param samples: Number of samples per night.
+    :param span: Total time covered per night, centred on midnight.
+    :param cache_dir: Directory of the cache files.
+    :param use_cache: Load/save the cache. Set to False to always recompute.
+    :return: Dictionary of arrays: sun_alt, sun_az, moon_alt, moon_az (degrees, nights x samples),
+        delta_midnight (hours) and midnights (JD).
+    """
+    location = site if isinstance(site, EarthLocation) else EarthLocation.of_site(site)
+    site_name = site if isinstance(site, str) else 'custom'
+    path = _cache_path(site_name, location, start, end, utcoffset, samples, span, cache_dir)
+    if use_cache and os.path.exists(path):
+        with np.load(path) as cached:
+            return {name: cached[name] for name in cached.files}
+
+    _, midnights, delta_midnight, times = night_grid(start, end, utcoffset, samples, span)
+    frame = AltAz(obstime=times, location=location)
+    # this might take a while the first time you run since it downloads a ~10MB file
+    sun = get_sun(times).transform_to(frame)
+    moon = get_body('moon', times, location).transform_to(frame)
+    ephemeris = {'sun_alt': sun.alt.to_value(u.deg).astype(np.float32),
+                 'sun_az': sun.az.to_value(u.deg).astype(np.float32),
+                 'moon_alt': moon.alt.to_value(u.deg).astype(np.float32),
+                 'moon_az': moon.az.to_value(u.deg).astype(np.float32),
+                 'delta_midnight': delta_midnight.to_value(u.hour),
+                 'midnights': midnights.jd}
+
+    if use_cache:
+        # Written next to the final file and renamed, so an interrupted run or another process
+        # computing the same range never leaves a truncated cache file behind
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez_compressed(file, **ephemeris)
+        os.replace(tmp_path, path)
+    return ephemeris
@@ -0,0 +1,209 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_DIR = os.path.join(os.path.dirname(__file__), 'query_results', 'metrics')
+
+# Upper edges of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., 300., float('inf'))
+
+
+class Timing:
+    """
+    Durations of one kind of call: count, total, min/max and a latency histogram.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+        self.rows = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, duration, ok=True, rows=0):
+        self.count += 1
+        self.errors += 0 if ok else 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+        self.rows += rows
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def quantile(self, q):
+        """
+        Approximate quantile: upper edge of the bucket holding it (the maximum for the last bucket).
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for edge, n in zip(LATENCY_BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(edge, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count, 'errors': self.errors, 'total_s': self.total,
+                'mean_s': self.total / self.count if self.count else None, 'min_s': self.min, 'max_s': self.max,
+                'p50_s': self.quantile(0.5), 'p90_s': self.quantile(0.9), 'p99_s': self.quantile(0.99),
+                'rows': self.rows,
+                'histogram': {('inf' if edge == float('inf') else str(edge)): n
+                              for edge, n in zip(LATENCY_BUCKETS, self.buckets)}}
+
+
+class Metrics:
+    """
+    Thread-safe registry of the timings and counters of one run: network requests per
+    service/operation, pipeline stages, and named counters (cache hits, retries, ...).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything recorded so far, e.g. between two runs in the same process.
+        """
+        with self._lock:
+            self.started = time.time()
+            self.requests = {}
+            self.stages = {}
+            self.counters = {}
+
+    def _add(self, table, name, duration, ok, rows):
+        with self._lock:
+            table.setdefault(name, Timing()).add(duration, ok, rows)
+
+    def count(self, name, n=1):
+        """
+        Add n to a named counter, e.g. count('simbad_cache.hits').
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def request(self, service, operation):
+        """
+        Time one network request. The yielded dict takes an optional 'rows' entry, the number of
+        rows sent or received, which is added up as the payload size. A request that raises is
+        counted as an error and the exception is passed on.
+        :param service: e.g. 'simbad', 'eso', 'gemini'.
+        :param operation: e.g. 'query_objects', 'query_region'.
+        """
+        record = {'rows': 0}
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield record
+            ok = True
+        finally:
+            self._add(self.requests, f"{service}.{operation}", time.perf_counter() - start, ok, record['rows'])
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time one pipeline stage (or any other block of work worth reporting on its own).
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self._add(self.stages, name, time.perf_counter() - start, ok, 0)
+
+    def report(self):
+        """
+        Everything recorded so far, as a JSON-serializable dictionary.
+        """
+        with self._lock:
+            return {'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                    'elapsed_s': time.time() - self.started,
+                    'requests': {name: timing.as_dict() for name, timing in sorted(self.requests.items())},
+                    'stages': {name: timing.as_dict() for name, timing in self.stages.items()},
+                    'counters': dict(sorted(self.counters.items()))}
+
+    def write_report(self, name, directory=METRICS_DIR):
+        """
+        Write the report to <directory>/<name>_<timestamp>.json and print a short summary.
+        :return: Path of the report.
+        """
+        report = self.report()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=1)
+        for label, timings in (('stage', report['stages']), ('request', report['requests'])):
+            for key, timing in timings.items():
+                print(f"  {label} {key}: {timing['count']} x, {timing['total_s']:.1f} s total, "
+                      f"p50 {timing['p50_s']:.2f} s, p90 {timing['p90_s']:.2f} s, {timing['errors']} errors")
+        print(f"Metrics saved to {path}")
+        return path
+
+
+# Shared by every module of the process
+METRICS = Metrics()
+
+
+class Progress:
+    """
+    Single status line on stderr with the items done, the current throughput and the ETA,
+    redrawn at most every `interval` seconds. Silent when stderr is not a terminal (e.g. in
+    run_surveys logs), where the usual print lines are enough.
+    """
+
+    def __init__(self, total, label='', interval=0.5, stream=None):
+        """
+        :param total: Number of items expected, or None if unknown (no ETA is shown).
+        :param label: Text shown in front of the counts.
+        :param interval: Minimum number of seconds between two redraws.
+        :param stream: Stream to write to. Default is sys.stderr.
+        """
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.enabled = self.stream.isatty()
+        self.done = 0
+        self._start = time.monotonic()
+        self._drawn = 0.
+        self._lock = threading.Lock()
+
+    def update(self, n=1):
+        """
+        Mark n more items as done.
+        """
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            if self.enabled and (now - self._drawn >= self.interval or self.done == self.total):
+                self._drawn = now
+                self._draw(now)
+
+    def _draw(self, now):
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.
+        if self.total is None:
+            self.stream.write(f"\r{self.label} {self.done} ({rate:.1f}/s)  ")
+            self.stream.flush()
+            return
+        eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+        eta = '?' if eta == float('inf') else time.strftime('%H:%M:%S', time.gmtime(eta))
+        self.stream.write(f"\r{self.label} {self.done}/{self.total} ({rate:.1f}/s, ETA {eta})  ")
+        self.stream.flush()
+
+    def close(self):
+        """
+        End the status line.
+        """
+        if self.enabled and self.done:
+            self.stream.write("\n")
+            self.stream.flush()
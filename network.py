@@ -0,0 +1,41 @@
+import time
+from metrics import METRICS
+
+# Semaphore shared by every process of a run_surveys job, None when running a script on its own
+_shared_slots = None
+
+
+def share_network_slots(semaphore):
+    """
+    Make every Simbad/archive request in this process hold a slot of `semaphore` while it runs,
+    so that processes working on different regions stay under one overall concurrency limit.
+    :param semaphore: multiprocessing (Bounded)Semaphore created by the parent process, or None
+        to remove the limit.
+    """
+    global _shared_slots
+    _shared_slots = semaphore
+
+
+def acquire_slot(blocking=True):
+    """
+    Take one of the shared slots if share_network_slots was called in this process. The time spent
+    waiting is added to the 'network.slot_wait_s' counter. Every successful call must be matched
+    by a release_slot, possibly from another thread.
+    :param blocking: Wait for a free slot. If False, return at once.
+    :return: Whether a slot was taken (always True without shared slots).
+    """
+    if _shared_slots is None:
+        return True
+    start = time.perf_counter()
+    acquired = _shared_slots.acquire(blocking)
+    METRICS.count('network.slot_wait_s', time.perf_counter() - start)
+    return acquired
+
+
+def release_slot():
+    """
+    Give back a slot taken by acquire_slot.
+    """
+    if _shared_slots is not None:
+        _shared_slots.release()
+
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from catalog_cache import file_digest
+from metrics import METRICS
+
+PIPELINE_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'query_results', 'pipeline')
+
+
+class Stage:
+    """
+    One step of a pipeline: function(upstream_output, **params) -> output.
+    """
+
+    def __init__(self, name, function, params=None, files=(), memoize=True, ttl=None, memoize_if=None):
+        """
+        :param name: Stage name, used in the cache file names and the progress output.
+        :param function: Called with the previous stage's output (None for the first stage) and params.
+        :param params: Keyword arguments of the function. They must be JSON-serializable, since
+            they are part of the stage's cache key.
+        :param files: Paths of input files read by the stage (e.g. the survey catalog). Their
+            contents are part of the cache key, so editing the file reruns the stage.
+        :param memoize: Store the output and reuse it when the key is unchanged. Set to False for
+            stages run for their side effects, e.g. writing the output files.
+        :param ttl: Seconds after which a stored output is recomputed, e.g. for network answers that
+            may change. None keeps it until the key changes.
+        :param memoize_if: Function of the output telling whether it may be stored, e.g. only
+            when no request failed. None stores every output.
+        """
+        self.name = name
+        self.function = function
+        self.params = params or {}
+        self.files = list(files)
+        self.memoize = memoize
+        self.ttl = ttl
+        self.memoize_if = memoize_if
+
+    def key(self, upstream_digest):
+        """
+        Hash of the stage's name, function, parameters, input files and the content of its input.
+        """
+        description = json.dumps({'stage': self.name,
+                                  'function': f"{self.function.__module__}.{self.function.__qualname__}",
+                                  'params': self.params,
+                                  'files': {path: file_digest(path) for path in self.files},
+                                  'upstream': upstream_digest}, sort_keys=True)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def run_stages(stages, cache_dir=PIPELINE_CACHE_DIR, use_cache=True):
+    """
+    Run stages in order, each one on the previous one's output. The output of every memoized
+    stage is pickled under a key made of its parameters and the hash of its input's content, so
+    a rerun only recomputes from the first stage whose parameters or input actually changed,
+    e.g. a new H limit reruns filter and write but not parse and resolve. Outputs older than
+    their stage's ttl are recomputed, and outputs rejected by its memoize_if are not stored.
+    :param stages: List of Stage.
+    :param cache_dir: Directory of the stage outputs.
+    :param use_cache: Set to False to run every stage.
+    :return: Output of the last stage.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    output, digest = None, ''
+    for stage in stages:
+        path = os.path.join(cache_dir, f"{stage.name}_{stage.key(digest)[:16]}.pkl")
+        start = time.monotonic()
+        stored = stage.memoize and use_cache and os.path.exists(path)
+        if stored and stage.ttl is not None and time.time() - os.path.getmtime(path) > stage.ttl:
+            print(f"[{stage.name}] stored output expired")
+            stored = False
+        if stored:
+            with open(path, 'rb') as file:
+                data = file.read()
+            output = pickle.loads(data)
+            METRICS.count('pipeline.cached_stages')
+            print(f"[{stage.name}] cached")
+        else:
+            with METRICS.stage(stage.name):
+                output = stage.function(output, **stage.params)
+            data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+            if stage.memoize and use_cache and (stage.memoize_if is None or stage.memoize_if(output)):
+                _write_atomic(path, data)
+            print(f"[{stage.name}] done in {time.monotonic() - start:.1f} s")
+        digest = hashlib.sha1(data).hexdigest()
+    return output
@@ -18,6 +18,7 @@ quantity_support()
 %matplotlib inline
 from IPython.display import display, HTML
 from matplotlib.animation import FuncAnimation
+from visibility import target_coords
 
 
 # %%
@@ -33,8 +34,7 @@ sourcelist_final = sourcelist
 
 sourcelist_final = sourcelist_final.reset_index()
 sources = sourcelist['Target']
-coords = [SkyCoord(ra * u.deg, dec * u.deg, frame='icrs') 
-          for ra, dec in zip(sourcelist['RA'], sourcelist['Decl'])]
+coords = target_coords(sourcelist['RA'], sourcelist['Decl'])
 
 # %% [markdown]
 # ## Set up observing params
@@ -47,82 +47,42 @@ utcoffset = -10*u.hour  # Hawaii Standard Time relative to UT
 midnights = Time(dates) - utcoffset
 
 # %%
-from astropy.coordinates import get_sun
-delta_midnight = np.linspace(-12, 12, 1000)*u.hour
-# midnight = Time('2022-4-02 00:00:00') - utcoffset
-# night = midnight + delta_midnight
-nights = midnights
-sun_altazs_nights =[]
-for night in nights:
-    night += delta_midnight
-    night_frame = AltAz(obstime=night, location=Subaru)
-    sun_altazs_night = get_sun(night).transform_to(night_frame)
-    sun_altazs_nights.append(sun_altazs_night)
-
-# %%
-# this might take a while the first time you run since it downloads a ~10MB file
-from astropy.coordinates import get_body
-moon_altazs_nights =[]
-nights = midnights
-for night in nights:
-    night += delta_midnight
-    night_frame = AltAz(obstime=night, location=Subaru)
-    moon_night = get_body('moon', night).transform_to(night_frame)
-    moon_altazs_nights.append(moon_night)
+# Sun and Moon alt/az for every night in one broadcast evaluation over a nights x samples grid.
+# Cached on disk (query_results/ephemeris) by site, date range and sampling, so restarts load instantly.
+from ephemeris import sun_moon_altaz
+ephem = sun_moon_altaz('Subaru', dates[0].strftime('%Y-%m-%d'), dates[-1].strftime('%Y-%m-%d'),
+                       utcoffset=utcoffset, samples=1000)
+delta_midnight = ephem['delta_midnight']*u.hour
+sun_alt_nights = ephem['sun_alt']*u.deg
+moon_alt_nights = ephem['moon_alt']*u.deg
 
 
 # %% [markdown]
 # ## Plot
 
 # %%
-from matplotlib.animation import FuncAnimation
+# Altitude of every target on every night, precomputed in one pass (nights x targets x samples)
+from azel_animation import altitude_cube, build_animation
+night_times = midnights[:, np.newaxis] + delta_midnight[np.newaxis, :]
+target_alt_nights = altitude_cube(coords, night_times, Subaru)
 
-# Alt vs time plot
-fig = plt.figure(figsize=(14,8))
-ax = fig.add_subplot(111)
-ax.set_xlabel('Hours from HST Midnight')
-ax.set_ylabel('Altitude [deg]')
-
-# Function to update the plot for each frame
-def update(frame):
-    ax.clear()
-    ax.set_xlabel('Hours from HST Midnight')
-    ax.set_ylabel('Altitude [deg]')
-    ax.set_xlim(-8*u.hour, 8*u.hour)
-    ax.set_xticks((np.arange(9)*2-8)*u.hour)
-    ax.set_ylim(0*u.deg, 90*u.deg)
-
-    # Update Sun and Moon
-    ax.plot(delta_midnight, sun_altazs_nights[frame].alt, lw=2, color='orange', ls='--', label='Sun')
-    ax.plot(delta_midnight, moon_altazs_nights[frame].alt, lw=2, color='white', alpha=0.5, ls='--', label='Moon')
-
-    # Update each source
-    color = cm.magma(np.linspace(0.4, 1, len(sources)))
-    for i, s in enumerate(sources):
-        night = midnights[frame] + delta_midnight
-        night_frame = AltAz(obstime=night, location=Subaru)
-        source_altazs_night = coords[i].transform_to(night_frame)
-        ax.plot(delta_midnight, source_altazs_night.alt, label=s,  ls='--', color=color[i])
-
-    # Twilight and night shading
-    ax.fill_between(delta_midnight, 0*u.deg, 90*u.deg,
-                    sun_altazs_nights[frame].alt < -0*u.deg, color='0.5', zorder=0)
-    ax.fill_between(delta_midnight, 0*u.deg, 90*u.deg,
-                    sun_altazs_nights[frame].alt < -18*u.deg, color='k', zorder=0)
-    
-    # Title
-    ax.set_title(dates[frame].strftime('%Y-%m-%d'))
-
-    # Legend
-    legend = ax.legend(loc='upper left', frameon=1)
-    frame = legend.get_frame()
-    frame.set_facecolor('gray')
-
-# Create animation
-ani = FuncAnimation(fig, update, frames=len(midnights), repeat=False)
+# %%
+# Alt vs time plot: artists are created once and each frame only updates their data (blitted)
+fig, ani, update = build_animation(dates, ephem['delta_midnight'], ephem['sun_alt'], ephem['moon_alt'],
+                                   target_alt_nights, sources)
 HTML(ani.to_jshtml())
 # plt.show()
 
+# %%
+# For a full semester or many targets, to_jshtml keeps every frame in memory. Render headless
+# on all cores straight to disk instead, e.g. from the repo root:
+#   python azel_animation.py disk_survey_data/S25B-Targets.csv --start 2025-08-01 --end 2026-01-31 -o S25B.mp4
+# or from here:
+# from azel_animation import render_frames, encode_frames
+# render_frames('azel_frames', dates, ephem['delta_midnight'], ephem['sun_alt'], ephem['moon_alt'],
+#               target_alt_nights, sources)
+# encode_frames('azel_frames', 'azel.mp4')
+
 # %%
 # # Sun and Moon
 # ax.plot(delta_midnight, sun_altazs_night.alt, lw=2, color='orange', ls='--', label='Sun')
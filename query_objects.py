@@ -1,36 +1,28 @@
 import os
 from astroquery.simbad import Simbad
 from datetime import datetime
+from request_executor import SIMBAD
+from simbad_batch import query_objects_chunked
 
 
-# Increase timeout duration
-Simbad.TIMEOUT = 300  # Set timeout to 5 minutes
+# Socket-level ceiling only; the executor gives up on stalled requests sooner and retries them
+Simbad.TIMEOUT = SIMBAD.max_timeout
 
-def get_info(identifiers, *fields, save_tsv=True):
+def get_info(identifiers, *fields, save_tsv=True, cache=None, aliases=None, chunk_size=200, max_workers=4):
     """
     Get information from Simbad for a list of identifiers.
     :param identifiers: List of identifiers to query
     :param fields: Fields to retrieve
     :param save_tsv: Save results to a TSV file. Default is True.
-    :return: Dictionary of query results.
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it.
+    :param chunk_size: Number of identifiers per Simbad request. Default is 200.
+    :param max_workers: Number of chunks queried in parallel. Default is 4.
+    :return: Dictionary of query results, each list aligned with identifiers.
     """
-    results = {}
-    Simbad.add_votable_fields(*fields)  # Configure Simbad to include imp data fields
-
-    # Batch query Simbad for magnitudes using all 2MASS names at once
-    try:
-        result_table = Simbad.query_objects(identifiers)  # Batch query
-        if result_table is not None:
-            for field in fields:
-                results[field] = result_table[field].filled(None).tolist()
-        else:
-            print("Batch query returned no results.")
-            for field in fields:
-                results[field] = [None] * len(identifiers)
-    except Exception as e:
-        print(f"Batch query failed: {e}")
-        for field in fields:
-            results[field] = [None] * len(identifiers)
+    # Chunked batch queries; a failing chunk is bisected so only the bad identifiers come back as None
+    results = query_objects_chunked(identifiers, list(fields), chunk_size=chunk_size,
+                                    max_workers=max_workers, cache=cache, aliases=aliases)
 
     if save_tsv:
         now = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -40,7 +32,7 @@ def get_info(identifiers, *fields, save_tsv=True):
         with open(fname, 'w') as file:
             file.write('Identifier\t' + '\t'.join(fields) + '\n')
             for i in range(len(identifiers)):
-                file.write(identifiers[i] + '\t' + '\t'.join([str(results[field][i]) for field in fields]) + '\n')
+                file.write(str(identifiers[i]) + '\t' + '\t'.join([str(results[field][i]) for field in fields]) + '\n')
             print(f"Results saved to '{fname}'")
     return results
 
@@ -0,0 +1,352 @@
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+from metrics import METRICS
+from network import acquire_slot, release_slot
+
+try:
+    from urllib3.exceptions import NameResolutionError  # urllib3 >= 2
+except ImportError:
+    NameResolutionError = socket.gaierror
+
+# HTTP statuses worth another attempt; any other HTTP error is the service's final answer
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request to a service that has been down for too long.
+    """
+
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None and isinstance(getattr(error, 'code', None), int):
+        status = error.code  # pyvo's DALServiceError
+    return status
+
+
+def _wrapped(error):
+    # The error and every error it wraps: pyvo's cause, urllib3's reason, chained and argument exceptions
+    chain, seen = [error], set()
+    for error in chain:
+        seen.add(id(error))
+        for inner in (getattr(error, 'cause', None), getattr(error, 'reason', None), error.__cause__,
+                      error.__context__) + tuple(error.args):
+            if isinstance(inner, BaseException) and id(inner) not in seen:
+                chain.append(inner)
+    return chain
+
+
+def is_transient(error):
+    """
+    Whether a failed request is worth retrying: timeouts, connection errors and 408/429/5xx
+    answers. Errors wrapped by pyvo, astroquery, requests or urllib3 are looked through. A host
+    name that does not resolve is a configuration error, not an outage, and fails at once.
+    """
+    chain = _wrapped(error)
+    if any(isinstance(inner, (socket.gaierror, NameResolutionError)) for inner in chain):
+        return False
+    for error in chain:
+        if isinstance(error, CircuitOpenError):
+            return False
+        status = _status_code(error)
+        if status is not None:
+            return status in TRANSIENT_STATUS
+        # OSError covers socket errors and requests' ConnectionError/Timeout
+        if isinstance(error, (TimeoutError, OSError)):
+            return True
+    return False
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class LatencyWindow:
+    """
+    Durations of the last `size` successful requests of one operation.
+    """
+
+    def __init__(self, size=200):
+        self._durations = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, duration):
+        with self._lock:
+            self._durations.append(duration)
+
+    def __len__(self):
+        return len(self._durations)
+
+    def quantile(self, q):
+        with self._lock:
+            durations = sorted(self._durations)
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(q * len(durations)))]
+
+
+class CircuitBreaker:
+    """
+    Stop dispatching to a service after `threshold` transient failures in a row. Callers are held
+    back for `cooldown` seconds, then a single probe request is let through: if it works dispatch
+    resumes, if not the breaker opens again for twice as long (up to max_cooldown). Once a service
+    has been down for more than `max_outage` seconds, callers get CircuitOpenError right away
+    instead of waiting, so the rest of a list is marked as failed rather than stalled.
+    """
+
+    def __init__(self, name, threshold=5, cooldown=15., max_cooldown=240., max_outage=900.):
+        """
+        :param name: Service name, for the messages.
+        :param threshold: Consecutive transient failures that open the breaker.
+        :param cooldown: First pause, in seconds.
+        :param max_cooldown: Longest pause between two probes.
+        :param max_outage: Seconds after which callers fail fast instead of waiting. None to always wait.
+        """
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_outage = max_outage
+        self.state = 'closed'
+        self.failures = 0
+        self._pause = cooldown
+        self._reopen_at = 0.
+        self._down_since = None
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Block until a request may be sent. Raises CircuitOpenError if the outage lasted too long.
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self.state == 'closed':
+                    return
+                if self.state == 'open' and now >= self._reopen_at:
+                    self.state = 'probing'  # This caller is the probe, the others keep waiting
+                    return
+                if self.max_outage is not None and now - self._down_since > self.max_outage:
+                    raise CircuitOpenError(f"{self.name} has been unavailable for {now - self._down_since:.0f} s")
+                self._condition.wait(max(0.05, self._reopen_at - now) if self.state == 'open' else 1.)
+
+    def success(self):
+        """
+        Record an answer from the service (including an error answer that is not transient).
+        """
+        with self._condition:
+            if self.state != 'closed':
+                print(f"{self.name} is answering again, resuming requests")
+            self.state = 'closed'
+            self.failures = 0
+            self._pause = self.cooldown
+            self._down_since = None
+            self._condition.notify_all()
+
+    def failure(self):
+        """
+        Record a transient failure.
+        """
+        with self._condition:
+            self.failures += 1
+            if self.state == 'probing' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state == 'probing':
+                    self._pause = min(2 * self._pause, self.max_cooldown)
+                else:
+                    self._down_since = time.monotonic()
+                self.state = 'open'
+                self._reopen_at = time.monotonic() + self._pause
+                METRICS.count(f"{self.name}.circuit_opened")
+                print(f"{self.name}: {self.failures} failures in a row, pausing requests for {self._pause:.0f} s")
+            self._condition.notify_all()
+
+
+class RequestExecutor:
+    """
+    Runs the requests to one service: a per-operation timeout learnt from recent latencies,
+    retries of transient failures with exponential backoff and full jitter, an optional hedged
+    duplicate for requests that take longer than usual, and a CircuitBreaker.
+
+    Every request holds one of the executor's max_in_flight slots and one of the processes'
+    shared slots (see network.share_network_slots) until it actually returns, including a request
+    abandoned after its timeout, so retries cannot pile up on top of stalled requests. A hedged
+    duplicate is only sent when both are free at that moment.
+    """
+
+    def __init__(self, name, initial_timeout=60., min_timeout=10., max_timeout=180., timeout_factor=4.,
+                 retries=3, backoff=1., max_backoff=30., hedge=False, min_samples=20, breaker=None,
+                 max_in_flight=8):
+        """
+        :param name: Service name, used in the metrics and messages, e.g. 'simbad'.
+        :param initial_timeout: Timeout in seconds until min_samples requests of an operation succeeded.
+        :param min_timeout: Lower bound of the learnt timeout.
+        :param max_timeout: Upper bound of the timeout, also after it was doubled by a timeout.
+        :param timeout_factor: Learnt timeout = timeout_factor x the 95th percentile of the latencies.
+        :param retries: Extra attempts after a transient failure.
+        :param backoff: Base delay in seconds; attempt n waits a random time up to backoff * 2**n.
+        :param max_backoff: Upper bound of the delay.
+        :param hedge: Send a duplicate request when the first one takes longer than the 90th
+            percentile of the latencies, and keep whichever answers first. Only for idempotent,
+            cheap requests. Can be overridden per call.
+        :param min_samples: Number of latencies needed before the timeout and hedge delay are learnt.
+        :param breaker: CircuitBreaker. Default is a new one for this service.
+        :param max_in_flight: Requests to the service running at once in this process, hedged and
+            abandoned ones included. Match it to the largest max_workers of the callers.
+        """
+        self.name = name
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.breaker = breaker or CircuitBreaker(name)
+        self.max_in_flight = max_in_flight
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def _window(self, operation):
+        with self._lock:
+            return self._latencies.setdefault(operation, LatencyWindow())
+
+    def timeout(self, operation):
+        """
+        Current timeout of an operation, in seconds.
+        """
+        window = self._window(operation)
+        if len(window) < self.min_samples:
+            return self.initial_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.timeout_factor * window.quantile(0.95)))
+
+    def hedge_delay(self, operation):
+        """
+        Seconds after which a hedged duplicate is sent, or None while too few latencies are known.
+        """
+        window = self._window(operation)
+        return window.quantile(0.9) if len(window) >= self.min_samples else None
+
+    def backoff_delay(self, attempt, error=None):
+        """
+        Full-jitter exponential backoff, or the server's Retry-After if it asks for longer.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, min(_retry_after(error) or 0., self.max_backoff))
+
+    def call(self, function, *args, operation='request', hedge=None, **kwargs):
+        """
+        Run function(*args, **kwargs) as one request to the service.
+        :param function: The request, e.g. Simbad.query_region.
+        :param operation: Operation name for the timeouts and metrics, e.g. 'query_region'.
+        :param hedge: Override the executor's hedge setting for this call.
+        :return: What function returned.
+        Raises the last error once the retries are used up, right away for errors that are not
+        transient, and CircuitOpenError when the service has been down for too long.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        timeout = self.timeout(operation)
+        for attempt in range(self.retries + 1):
+            self.breaker.acquire()
+            try:
+                result = self._attempt(function, args, kwargs, operation, timeout, hedge)
+            except Exception as error:
+                if not is_transient(error):
+                    self.breaker.success()  # The service did answer
+                    raise
+                self.breaker.failure()
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff_delay(attempt, error)
+                METRICS.count(f"{self.name}.{operation}.retries")
+                print(f"{self.name} {operation} failed ({error}), retry {attempt + 1}/{self.retries} "
+                      f"in {delay:.1f} s")
+                if isinstance(error, TimeoutError):
+                    timeout = min(2 * timeout, self.max_timeout)
+                time.sleep(delay)
+            else:
+                self.breaker.success()
+                return result
+
+    def _acquire(self, blocking=True):
+        # A slot of this executor, then a shared one
+        if not self._in_flight.acquire(blocking):
+            return False
+        if not acquire_slot(blocking):
+            self._in_flight.release()
+            return False
+        return True
+
+    def _release(self):
+        release_slot()
+        self._in_flight.release()
+
+    def _attempt(self, function, args, kwargs, operation, timeout, hedge):
+        """
+        One attempt, plus its hedged duplicate if it runs late. Requests run in daemon threads, so
+        one that stalls past the timeout is abandoned without blocking the caller; it keeps its
+        slots until it returns.
+        """
+        answers = queue.Queue()
+
+        def request():
+            start = time.perf_counter()
+            try:
+                with METRICS.request(self.name, operation) as record:
+                    result = function(*args, **kwargs)
+                    record['rows'] = len(result) if hasattr(result, '__len__') else 0
+            except Exception as error:
+                answers.put((False, error))
+            else:
+                self._window(operation).add(time.perf_counter() - start)
+                answers.put((True, result))
+            finally:
+                self._release()
+
+        self._acquire()  # Waits for earlier requests still running, abandoned ones included
+        start = time.monotonic()
+        deadline = start + timeout
+        hedge_delay = self.hedge_delay(operation) if hedge else None
+        hedge_at = None if hedge_delay is None else start + hedge_delay
+        threading.Thread(target=request, daemon=True).start()
+        sent, received = 1, 0
+        while True:
+            wake = deadline if hedge_at is None or sent > 1 else min(deadline, hedge_at)
+            try:
+                ok, value = answers.get(timeout=max(0., wake - time.monotonic()))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    METRICS.count(f"{self.name}.{operation}.timeouts")
+                    raise TimeoutError(f"no answer from {self.name} after {timeout:.0f} s")
+                if self._acquire(blocking=False):
+                    METRICS.count(f"{self.name}.{operation}.hedged")
+                    threading.Thread(target=request, daemon=True).start()
+                    sent += 1
+                else:
+                    METRICS.count(f"{self.name}.{operation}.hedges_skipped")  # Every slot is busy
+                    hedge_at = None
+                continue
+            received += 1
+            if ok:
+                return value
+            if received == sent:
+                raise value
+
+
+# One executor per service, shared by every module of the process
+# (max_in_flight: 8 cone searches in simbad_resolver, 4 workers per archive in archive_query)
+SIMBAD = RequestExecutor('simbad', initial_timeout=60., min_timeout=10., max_timeout=180., max_in_flight=8)
+ESO = RequestExecutor('eso', initial_timeout=60., min_timeout=15., max_timeout=180., max_in_flight=4)
+GEMINI = RequestExecutor('gemini', initial_timeout=60., min_timeout=15., max_timeout=120., max_in_flight=4)
@@ -0,0 +1,201 @@
+import argparse
+import contextlib
+import importlib.util
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from network import share_network_slots
+
+base_path = os.path.dirname(os.path.abspath(__file__))
+
+# Survey name -> script with a main(...) entry point
+SURVEYS = {
+    'orion': 'get_targets_orion.py',
+    'taurus': 'get_targets_taurus.py',
+    'taurus_classII': os.path.join('disk_survey_data', 'taurus', 'get_targets_taurus_classII.py'),
+    'soda': os.path.join('disk_survey_data', 'orion', 'get_targets_SODA.py'),
+    'vision': os.path.join('disk_survey_data', 'orion', 'get_targets_VISION.py'),
+    'odisea': os.path.join('disk_survey_data', 'ophiuchus', 'get_targets_ODISEA.py'),
+    'archive': 'archive_query.py',
+}
+LOG_DIR = os.path.join(base_path, 'query_results', 'run_surveys')
+# Run options that not every survey script supports -> command line flag, for the warnings
+OPTION_FLAGS = {'resolve_mode': '--resolve-mode', 'retry_failed': '--retry-failed', 'retry_radii': '--retry-radii',
+                'stream': '--stream', 'use_cache': '--no-cache'}
+
+# Example config file:
+# {
+#   "workers": 4,
+#   "max_network": 8,
+#   "defaults": {"G_limit": 12, "H_limit": 9},
+#   "jobs": [
+#     {"survey": "soda", "H_limit": 10},
+#     {"survey": "vision"},
+#     {"survey": "archive", "file_path": "disk_survey_data/orion/orion_sources_rev.txt", "optional_tag": "orion"}
+#   ]
+# }
+
+
+def load_entry_point(survey):
+    """
+    Import a survey script by path and return its main function.
+    """
+    path = os.path.join(base_path, SURVEYS[survey])
+    spec = importlib.util.spec_from_file_location(f"survey_{survey}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.main
+
+
+def job_arguments(job, defaults):
+    """
+    Keyword arguments for a job's main function: the defaults it accepts, overridden by the job's own.
+    Raises ValueError for unknown arguments or missing limits, since a scheduled run cannot prompt.
+    Also raises it when a retry is asked of a survey that cannot retry (it would do a full run
+    instead), and prints a warning for the other run options (OPTION_FLAGS) it does not support.
+    """
+    parameters = inspect.signature(load_entry_point(job['survey'])).parameters
+    unknown = [key for key in job if key not in parameters and key not in ('survey', 'name')]
+    if unknown:
+        raise ValueError(f"Job {job['name']}: unknown arguments {unknown}, expected some of {list(parameters)}")
+    # Archive jobs take none of the survey options, they are only meant for the surveys
+    ignored = [OPTION_FLAGS[key] for key in OPTION_FLAGS
+               if defaults.get(key) is not None and key not in parameters and job['survey'] != 'archive']
+    if defaults.get('retry_failed') and '--retry-failed' in ignored:
+        raise ValueError(f"Job {job['name']}: {SURVEYS[job['survey']]} cannot retry failed queries "
+                         f"(it resolves by name), leave it out of a --retry-failed run")
+    if ignored:
+        print(f"⚠️ Job {job['name']}: {', '.join(ignored)} not supported by {SURVEYS[job['survey']]}, ignored")
+    kwargs = {key: value for key, value in defaults.items() if key in parameters}
+    kwargs.update({key: value for key, value in job.items() if key in parameters})
+    missing = [key for key in ('G_limit', 'H_limit', 'file_path') if key in parameters and kwargs.get(key) is None]
+    if missing:
+        raise ValueError(f"Job {job['name']}: {', '.join(missing)} must be given")
+    if 'file_path' in kwargs:
+        kwargs['file_path'] = os.path.join(base_path, kwargs['file_path'])
+    return kwargs
+
+
+def run_job(job, kwargs, log_dir):
+    """
+    Run one job in a worker process, with its output going to <log_dir>/<name>.log.
+    :return: (name, ok, elapsed seconds, log path).
+    """
+    log_path = os.path.join(log_dir, f"{job['name']}.log")
+    start = time.monotonic()
+    ok = True
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            load_entry_point(job['survey'])(**kwargs)
+        except Exception:
+            traceback.print_exc()
+            ok = False
+    return job['name'], ok, time.monotonic() - start, log_path
+
+
+def run_jobs(jobs, defaults=None, workers=4, max_network=8, log_dir=None):
+    """
+    Run survey jobs in parallel worker processes. Every Simbad/archive request of every worker takes
+    one of `max_network` shared slots, so the limit holds for the run as a whole. Archive jobs start
+    after the survey jobs, since they usually read the lists those write.
+    :param jobs: List of dicts with a 'survey' key (see SURVEYS) and the arguments of its main function.
+    :param defaults: Arguments given to every job that accepts them, e.g. {'G_limit': 12, 'H_limit': 9}.
+    :param workers: Number of worker processes.
+    :param max_network: Requests in flight at once over all workers. 0 disables the limit.
+    :param log_dir: Directory of the per-job logs. Default is a new time-stamped one under LOG_DIR.
+    :return: List of (name, ok, elapsed seconds, log path), in job order.
+    """
+    defaults = defaults or {}
+    names = set()
+    for i, job in enumerate(jobs):
+        if job.get('survey') not in SURVEYS:
+            raise ValueError(f"Job {i}: unknown survey {job.get('survey')!r}, expected one of {list(SURVEYS)}")
+        name = job.get('name') or job['survey']
+        if name in names:
+            name = f"{name}_{i}"
+        names.add(name)
+        job['name'] = name
+    arguments = [job_arguments(job, defaults) for job in jobs]
+
+    log_dir = log_dir or os.path.join(LOG_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(log_dir, exist_ok=True)
+    context = multiprocessing.get_context()
+    slots = context.BoundedSemaphore(max_network) if max_network else None
+    phases = [[i for i, job in enumerate(jobs) if job['survey'] != 'archive'],
+              [i for i, job in enumerate(jobs) if job['survey'] == 'archive']]
+
+    outcomes = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=share_network_slots, initargs=(slots,)) as pool:
+        for phase in phases:
+            futures = {pool.submit(run_job, jobs[i], arguments[i], log_dir): i for i in phase}
+            for future in as_completed(futures):
+                name, ok, elapsed, log_path = future.result()
+                outcomes[futures[future]] = (name, ok, elapsed, log_path)
+                print(f"{name}: {'done' if ok else 'FAILED'} in {elapsed:.1f} s (log: {log_path})")
+    return [outcomes[i] for i in range(len(jobs))]
+
+
+def main(argv=None):
+    # e.g. python run_surveys.py soda vision odisea taurus --G-limit 12 --H-limit 9
+    #      python run_surveys.py soda vision odisea --G-limit 12 --H-limit 9 --retry-failed --retry-radii 2,5,10
+    #      python run_surveys.py --config surveys.json
+    parser = argparse.ArgumentParser(description='Run several survey target selections in parallel, without prompts.')
+    parser.add_argument('surveys', nargs='*', help=f"Surveys to run: {', '.join(name for name in SURVEYS if name != 'archive')}")
+    parser.add_argument('--config', help='JSON file with "jobs", "defaults", "workers" and "max_network"')
+    parser.add_argument('--G-limit', dest='G_limit', type=float, help='G magnitude limit for every survey')
+    parser.add_argument('--H-limit', dest='H_limit', type=float, help='H magnitude limit for every survey')
+    parser.add_argument('--resolve-mode', dest='resolve_mode', choices=['tap', 'cone', 'tiled'],
+                        help='Position resolution mode')
+    parser.add_argument('--stream', action='store_true', default=None,
+                        help='Read the catalogs lazily and write the selected sources batch by batch')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', default=None,
+                        help='Rerun every pipeline stage instead of reusing the stored outputs')
+    parser.add_argument('--retry-failed', dest='retry_failed', action='store_true', default=None,
+                        help='Only query the failed positions of the coordinate-driven surveys again')
+    parser.add_argument('--retry-radii', dest='retry_radii', type=lambda text: [float(r) for r in text.split(',')],
+                        metavar='R1,R2,...', help='Radius schedule of --retry-failed in arcsec (default 2,5,10)')
+    parser.add_argument('--archive', action='append', default=[], metavar='FILE[:TAG]',
+                        help='Query the archives for the objects in FILE afterwards (repeatable)')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default 4)')
+    parser.add_argument('--max-network', dest='max_network', type=int,
+                        help='Network requests in flight over all workers (default 8, 0 for no limit)')
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config, 'r') as file:
+            config = json.load(file)
+    jobs = list(config.get('jobs', []))
+    jobs += [{'survey': survey} for survey in args.surveys]
+    for archive in args.archive:
+        file_path, _, tag = archive.partition(':')
+        jobs.append({'survey': 'archive', 'file_path': file_path, 'optional_tag': tag or None})
+    if not jobs:
+        parser.error('no surveys given')
+
+    defaults = dict(config.get('defaults', {}))
+    defaults.update({key: getattr(args, key) for key in ('G_limit', 'H_limit', 'resolve_mode', 'retry_failed',
+                                                         'retry_radii', 'stream', 'use_cache')
+                     if getattr(args, key) is not None})
+    workers = args.workers or config.get('workers', 4)
+    max_network = args.max_network if args.max_network is not None else config.get('max_network', 8)
+
+    try:
+        outcomes = run_jobs(jobs, defaults, workers=workers, max_network=max_network)
+    except ValueError as e:
+        parser.error(str(e))
+    failed = [name for name, ok, _, _ in outcomes if not ok]
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
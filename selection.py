@@ -0,0 +1,192 @@
+import ast
+import io
+import tokenize
+from functools import lru_cache
+import numpy as np
+
+# Fill value used for missing magnitudes in Simbad/VOTable output (the 1e+20 in orion_sources_rev.txt)
+SENTINEL = 1e20
+
+# '&', '|' and '~' are read as 'and', 'or' and 'not' so that "G > 12 & H < 9" groups as intended
+_LOGICAL_TOKENS = {'&': 'and', '|': 'or', '~': 'not'}
+_ALLOWED_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+                  ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Compare, ast.Lt, ast.LtE, ast.Gt,
+                  ast.GtE, ast.Eq, ast.NotEq, ast.Name, ast.Load, ast.Constant, ast.Call)
+_FUNCTIONS = ('missing', 'abs')
+
+
+def as_magnitudes(values, sentinel=SENTINEL):
+    """
+    Masked float array of magnitudes, with None, NaN and sentinel values (|m| >= sentinel) masked.
+    :param values: List or array of magnitudes, e.g. G_mags from get_info.
+    :param sentinel: Values at or beyond this magnitude are treated as missing.
+    """
+    if isinstance(values, np.ma.MaskedArray):
+        data = np.ma.getdata(values).astype(float)
+        mask = np.ma.getmaskarray(values).copy()
+    else:
+        data = np.array([np.nan if value is None else value for value in values], dtype=float)
+        mask = np.zeros(len(data), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        mask |= ~np.isfinite(data) | (np.abs(data) >= sentinel)
+    return np.ma.masked_array(np.where(mask, 0., data), mask=mask)
+
+
+# Three-valued logic on masked boolean arrays: a comparison involving a missing value is unknown,
+# "unknown and False" is False, "unknown or True" is True, anything else unknown stays unknown.
+def _true_false(value):
+    value = np.ma.asarray(value)
+    return value.filled(False).astype(bool), ~value.filled(True).astype(bool)
+
+
+def _known(true, false):
+    return np.ma.masked_array(true, mask=~(true | false))
+
+
+def _and(*values):
+    true, false = _true_false(values[0])
+    for value in values[1:]:
+        value_true, value_false = _true_false(value)
+        true, false = true & value_true, false | value_false
+    return _known(true, false)
+
+
+def _or(*values):
+    true, false = _true_false(values[0])
+    for value in values[1:]:
+        value_true, value_false = _true_false(value)
+        true, false = true | value_true, false & value_false
+    return _known(true, false)
+
+
+def _not(value):
+    true, false = _true_false(value)
+    return _known(false, true)
+
+
+def _missing(value):
+    return np.ma.getmaskarray(np.ma.asarray(value))
+
+
+class _Rewrite(ast.NodeTransformer):
+    # and/or/not become the three-valued helpers, chained comparisons a < b < c become (a < b) and (b < c)
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        function = '_and' if isinstance(node.op, ast.And) else '_or'
+        return ast.Call(ast.Name(function, ast.Load()), node.values, [])
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Call(ast.Name('_not', ast.Load()), [node.operand], [])
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        operands = [node.left, *node.comparators]
+        pairs = [ast.Compare(left, [op], [right]) for left, op, right in zip(operands, node.ops, operands[1:])]
+        return ast.Call(ast.Name('_and', ast.Load()), pairs, [])
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        node.func = ast.Name('_' + node.func.id if node.func.id == 'missing' else node.func.id, ast.Load())
+        return node
+
+
+def _logical_words(expression):
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(expression).readline):
+        if token.type == tokenize.OP and token.string in _LOGICAL_TOKENS:
+            tokens.append((tokenize.NAME, _LOGICAL_TOKENS[token.string]))
+        else:
+            tokens.append((token.type, token.string))
+    return tokenize.untokenize(tokens)
+
+
+class Selection:
+    """
+    A row selection over magnitude columns, e.g. "G > 12 & H < 9 & (J-K) > 1", parsed and compiled
+    once and then evaluated on whole arrays.
+    Expressions may use column names, numbers, + - * /, comparisons (including chained ones like
+    8 < H < 10), & | ~ (or and / or / not), abs(x) and missing(x). Other names are parameters
+    given at evaluation time, so thresholds can be changed without recompiling:
+    Selection("G > G_limit & H < H_limit").mask(bands, G_limit=12, H_limit=9).
+    Missing magnitudes (None, NaN, 1e+20 sentinels) make a comparison unknown rather than True or
+    False. Unknown rows are excluded unless missing='include'; missing(x) tests for them directly.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            tree = ast.parse(_logical_words(expression).strip(), mode='eval')
+        except (SyntaxError, tokenize.TokenError) as e:
+            raise ValueError(f"Invalid selection {expression!r}: {e}") from None
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"Invalid selection {expression!r}: {type(node).__name__} is not allowed")
+            if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS
+                                               or node.keywords or len(node.args) != 1):
+                raise ValueError(f"Invalid selection {expression!r}: only {', '.join(_FUNCTIONS)} of one value "
+                                 f"can be called")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f"Invalid selection {expression!r}: {node.value!r} is not a number")
+        calls = {node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call)}
+        self.names = sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)} - calls)
+        tree = ast.fix_missing_locations(_Rewrite().visit(tree))
+        self._code = compile(tree, '<selection>', 'eval')
+
+    def __repr__(self):
+        return f"Selection({self.expression!r})"
+
+    def evaluate(self, columns, **parameters):
+        """
+        Evaluate the expression.
+        :param columns: Dictionary of column name to list/array of magnitudes (see as_magnitudes).
+        :param parameters: Values for the names that are not columns, e.g. G_limit=12.
+        :return: Masked boolean array, masked where the result is unknown.
+        """
+        namespace = {'__builtins__': {}, 'abs': np.ma.abs, '_missing': _missing,
+                     '_and': _and, '_or': _or, '_not': _not}
+        for name in self.names:
+            if name in parameters:
+                namespace[name] = parameters[name]
+            elif name in columns:
+                namespace[name] = as_magnitudes(columns[name])
+            else:
+                raise KeyError(f"{name!r} in {self.expression!r} is neither a column nor a parameter")
+        length = len(next(iter(columns.values()))) if columns else 0
+        result = np.ma.asarray(eval(self._code, namespace))
+        return np.ma.masked_array(np.broadcast_to(result.filled(False), (length,)),
+                                  mask=np.broadcast_to(np.ma.getmaskarray(result), (length,)))
+
+    def mask(self, columns, missing='exclude', **parameters):
+        """
+        Boolean array of the selected rows.
+        :param columns: Dictionary of column name to list/array of magnitudes.
+        :param missing: 'exclude' (default) or 'include' rows whose result is unknown because of missing values.
+        :param parameters: Values for the names that are not columns.
+        """
+        if missing not in ('exclude', 'include'):
+            raise ValueError(f"missing must be 'exclude' or 'include', not {missing!r}")
+        return self.evaluate(columns, **parameters).filled(missing == 'include')
+
+    __call__ = mask
+
+
+@lru_cache(maxsize=128)
+def compile_selection(expression):
+    """
+    Cached Selection for an expression string, so repeated calls do not re-parse it.
+    """
+    return Selection(expression)
+
+
+def select(expression, columns, missing='exclude', **parameters):
+    """
+    Indices of the rows matching a selection expression, e.g.
+    select("G > G_limit & H < H_limit", {'G': G_mags, 'H': H_mags}, G_limit=12, H_limit=9).
+    See Selection for the expression syntax and the handling of missing values.
+    """
+    return np.flatnonzero(compile_selection(expression).mask(columns, missing=missing, **parameters))
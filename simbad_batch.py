@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from astroquery.simbad import Simbad
+from metrics import METRICS, Progress
+from alias_index import resolve_index
+from request_executor import SIMBAD, CircuitOpenError
+from simbad_cache import normalize_identifier, plain_value, resolve_cache
+
+
+def matched_rows(result_table, identifiers):
+    """
+    Line up the rows of a query_objects table with the identifiers that were sent.
+    :param result_table: Table returned by Simbad.query_objects.
+    :param identifiers: The identifiers of that request, in order.
+    :return: List of rows (None where Simbad did not know the identifier).
+    """
+    if 'user_specified_id' in result_table.colnames:
+        by_id = {}
+        for row in result_table:
+            by_id.setdefault(normalize_identifier(row['user_specified_id']), row)
+        rows = [by_id.get(normalize_identifier(identifier)) for identifier in identifiers]
+    else:
+        rows = list(result_table)
+    if 'main_id' in result_table.colnames:
+        rows = [None if row is None or np.ma.is_masked(row['main_id']) or not str(row['main_id']).strip()
+                else row for row in rows]
+    return rows
+
+
+def query_chunk(identifiers, fields):
+    """
+    One Simbad.query_objects request, retried on transient failures by request_executor.SIMBAD.
+    :param identifiers: Identifiers of the chunk.
+    :param fields: Fields to read from the result.
+    :return: List of records (dict of field values, or None if not found), aligned with identifiers.
+    """
+    result_table = SIMBAD.call(Simbad.query_objects, identifiers, operation='query_objects')  # Batch query
+    if result_table is None:
+        return [None] * len(identifiers)
+    return [None if row is None else {field: plain_value(row[field]) for field in fields}
+            for row in matched_rows(result_table, identifiers)]
+
+
+def query_with_bisection(identifiers, fields, retries=0, retry_wait=5.):
+    """
+    Query a chunk, and if it keeps failing split it in two and query each half, down to single
+    identifiers. One bad identifier (or one that makes the request time out) then only costs itself.
+    Transient failures are already retried with backoff by the executor, so by default a chunk is
+    split as soon as its request fails for good. Nothing is split while Simbad is down.
+    :param identifiers: Identifiers of the chunk.
+    :param fields: Fields to read from the result.
+    :param retries: Extra attempts for the whole chunk before it is split. Halves get one attempt.
+    :param retry_wait: Seconds to wait before retrying.
+    :return: (records, failed) lists aligned with identifiers. failed marks identifiers whose
+        requests raised, as opposed to identifiers Simbad does not know.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return query_chunk(identifiers, fields), [False] * len(identifiers)
+        except CircuitOpenError as e:
+            print(f"Batch query skipped for {identifiers[0]} .. {identifiers[-1]} ({len(identifiers)} ids): {e}")
+            return [None] * len(identifiers), [True] * len(identifiers)
+        except Exception as e:
+            print(f"Batch query failed for {identifiers[0]} .. {identifiers[-1]} "
+                  f"({len(identifiers)} ids, attempt {attempt + 1}/{retries + 1}): {e}")
+            if attempt < retries:
+                METRICS.count('simbad.query_objects.retries')
+                time.sleep(retry_wait)
+    if len(identifiers) == 1:
+        print(f"Giving up on {identifiers[0]}")
+        METRICS.count('simbad.query_objects.given_up')
+        return [None], [True]
+    METRICS.count('simbad.query_objects.bisections')
+    mid = len(identifiers) // 2
+    left_records, left_failed = query_with_bisection(identifiers[:mid], fields, 0, retry_wait)
+    right_records, right_failed = query_with_bisection(identifiers[mid:], fields, 0, retry_wait)
+    return left_records + right_records, left_failed + right_failed
+
+
+def query_objects_chunked(identifiers, fields, chunk_size=200, max_workers=4, retries=0, retry_wait=5.,
+                          cache=None, aliases=None, errors=None):
+    """
+    Query Simbad for a list of identifiers in chunks of `chunk_size` batch requests, with up to
+    `max_workers` chunks in flight. A failing chunk is retried and then bisected on its own, so
+    only the identifiers that really fail come back as None. Identifiers the alias index maps to
+    an object already in the cache cost nothing, and several forms of one object are sent once.
+    :param identifiers: List of identifiers (None entries are skipped).
+    :param fields: Fields to retrieve, e.g. ['main_id', 'ra', 'dec', 'G', 'J', 'H', 'K'].
+    :param chunk_size: Number of identifiers per request.
+    :param max_workers: Number of chunks queried in parallel.
+    :param retries: Extra attempts for a chunk that raised, before it is bisected.
+    :param retry_wait: Seconds to wait before retrying a chunk.
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it.
+    :param errors: Optional list; every identifier whose request raised (as opposed to one Simbad
+        does not know) is appended to it.
+    :return: Dictionary of lists aligned with the input identifiers, one per field.
+    """
+    results = {field: [None] * len(identifiers) for field in fields}
+    cache = resolve_cache(cache)
+    aliases = resolve_index(aliases)
+    record_fields = list(fields) + ([] if 'main_id' in fields else ['main_id'])  # main_id feeds the alias index
+    Simbad.add_votable_fields(*fields)  # Configure Simbad to include imp data fields
+
+    # Only objects missing from the cache go to Simbad, once each, under their main_id if known
+    pending = {}  # normalized identifier sent -> input indices
+    sent = {}  # normalized identifier sent -> identifier as sent
+    for i, identifier in enumerate(identifiers):
+        if identifier is None:
+            continue
+        main_id = None if aliases is None else aliases.lookup(identifier)
+        hit, record = (False, None) if cache is None else cache.get_object(identifier, fields)
+        if not hit and cache is not None and main_id is not None:
+            hit, record = cache.get_object(main_id, fields)
+        if not hit:
+            key = normalize_identifier(main_id or identifier)
+            pending.setdefault(key, []).append(i)
+            sent.setdefault(key, main_id or identifier)
+        elif record is not None:
+            for field in fields:
+                results[field][i] = record[field]
+    if identifiers and not pending:
+        print("All identifiers found in the cache.")
+
+    keys = list(pending)
+    chunks = [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+    done = 0
+    progress = Progress(len(keys), 'query_objects')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(query_with_bisection, [sent[key] for key in chunk], record_fields,
+                                   retries, retry_wait): chunk
+                   for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            records, failed = future.result()
+            done += len(chunk)
+            print(f"Queried {done}/{len(keys)} objects")
+            progress.update(len(chunk))
+
+            # Results are written back by input index, so completion order does not matter
+            found = []
+            for key, record, failed_i in zip(chunk, records, failed):
+                for i in pending[key]:
+                    if record is not None:
+                        for field in fields:
+                            results[field][i] = record[field]
+                        found.append((identifiers[i], record['main_id']))
+                    if cache is not None and not failed_i:
+                        cache.put_object(identifiers[i], record, record_fields)
+                    if failed_i and errors is not None:
+                        errors.append(identifiers[i])
+                if cache is not None and record is not None:
+                    cache.put_object(record['main_id'], record, record_fields)
+            if aliases is not None:
+                aliases.add(found)
+    progress.close()
+    return results
@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from metrics import METRICS
+
+# Shared by every script in the repo, so a second run over the same catalog stays offline
+CACHE_PATH = os.environ.get('SIMBAD_CACHE',
+                            os.path.join(os.path.dirname(__file__), 'query_results', 'simbad_cache.sqlite'))
+DEFAULT_TTL = 30 * 24 * 3600  # Simbad magnitudes rarely change, a month is plenty
+NEGATIVE_TTL = 7 * 24 * 3600  # "not found" is retried sooner, Simbad does get new entries
+MAX_ENTRIES = 500000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    fields   TEXT NOT NULL,
+    value    TEXT,
+    created  REAL NOT NULL,
+    expires  REAL NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+def normalize_identifier(identifier):
+    """
+    Normalize a Simbad identifier so that '2MASS  J0413+28' and '2mass j0413+28' share a cache entry.
+    :param identifier: Identifier as typed by the user or read from a catalog.
+    :return: Normalized identifier.
+    """
+    return ' '.join(str(identifier).split()).upper()
+
+
+def object_key(identifier):
+    """
+    Cache key for an identifier lookup.
+    """
+    return 'id:' + normalize_identifier(identifier)
+
+
+def region_key(ra_deg, dec_deg, radius_arcsec, precision=5):
+    """
+    Cache key for a cone search. Coordinates are rounded to `precision` decimals of a degree
+    (~0.04" at the default), which is well inside any radius the scripts use.
+    :param ra_deg: Right ascension in degrees.
+    :param dec_deg: Declination in degrees.
+    :param radius_arcsec: Search radius in arcseconds.
+    :param precision: Number of decimals kept on the coordinates.
+    :return: Cache key.
+    """
+    return f"cone:{ra_deg:.{precision}f}:{dec_deg:+.{precision}f}:{radius_arcsec:g}"
+
+
+def plain_value(value):
+    """
+    Convert a value coming out of an astropy table (numpy scalar, masked value, bytes) to a plain
+    Python value, with None for masked entries.
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'mask') and bool(value.mask):
+        return None
+    if isinstance(value, bytes):
+        return value.decode()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class SimbadCache:
+    """
+    Persistent SQLite cache for Simbad lookups.
+
+    Each entry stores the list of fields it was queried with, so a lookup asking for more
+    fields than were stored counts as a miss. A value of None is a negative entry ("not found").
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES):
+        """
+        :param path: SQLite file, created if missing.
+        :param ttl: Lifetime of an entry in seconds.
+        :param negative_ttl: Lifetime of a "not found" entry in seconds.
+        :param max_entries: Least recently used entries are evicted beyond this size.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets several scripts read while one writes, and keeps per-entry commits cheap
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+
+    def get(self, key, fields=()):
+        """
+        Look up a key.
+        :param key: Cache key, see object_key and region_key.
+        :param fields: Fields the caller needs; the entry must have been stored with all of them.
+        :return: (hit, value). value is None for a negative entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT fields, value, expires FROM entries WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None or row[2] < now or not set(fields) <= set(json.loads(row[0])):
+                self.misses += 1
+                METRICS.count('simbad_cache.misses')
+                return False, None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        METRICS.count('simbad_cache.hits')
+        return True, None if row[1] is None else json.loads(row[1])
+
+    def put(self, key, value, fields=(), ttl=None):
+        """
+        Store a value. Pass value=None to remember that nothing was found.
+        :param key: Cache key.
+        :param value: JSON-serializable value (dicts of numpy scalars are converted), or None.
+        :param fields: Fields the value was queried with.
+        :param ttl: Override the default lifetime, in seconds.
+        """
+        if isinstance(value, dict):
+            value = {k: plain_value(v) for k, v in value.items()}
+        else:
+            value = plain_value(value)
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, json.dumps(sorted(fields)), None if value is None else json.dumps(value),
+                                now, now + ttl, now))
+            self._conn.commit()
+            self._puts += 1
+            check_size = self._puts % 1000 == 0
+        if check_size:
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count <= self.max_entries:
+                return
+            self._conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+            self._conn.execute("DELETE FROM entries WHERE key IN "
+                               "(SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                               (max(0, count - self.max_entries),))
+            self._conn.commit()
+
+    def get_object(self, identifier, fields=()):
+        """
+        Look up the cached record of an identifier.
+        :return: (hit, record dict or None).
+        """
+        return self.get(object_key(identifier), fields)
+
+    def put_object(self, identifier, record, fields=()):
+        """
+        Store the record (dict of field values) of an identifier, or None if Simbad does not know it.
+        """
+        self.put(object_key(identifier), record, fields)
+
+    def get_region(self, ra_deg, dec_deg, radius_arcsec, fields=()):
+        """
+        Look up a cached cone search.
+        :return: (hit, record dict or None).
+        """
+        return self.get(region_key(ra_deg, dec_deg, radius_arcsec), fields)
+
+    def put_region(self, ra_deg, dec_deg, radius_arcsec, record, fields=()):
+        """
+        Store the result of a cone search, or None if it returned nothing.
+        """
+        self.put(region_key(ra_deg, dec_deg, radius_arcsec), record, fields)
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    The cache shared by all scripts, opened on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SimbadCache()
+    return _default_cache
+
+
+def resolve_cache(cache):
+    """
+    Turn a `cache` argument into a cache object: None means the shared default, False disables caching.
+    """
+    if cache is None:
+        return default_cache()
+    return cache or None
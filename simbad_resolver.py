@@ -0,0 +1,243 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from astroquery.simbad import Simbad
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+from metrics import Progress
+from request_executor import SIMBAD
+from alias_index import resolve_index
+from simbad_cache import resolve_cache
+from tiling import assign_nearest, plan_tiles
+
+
+class RateLimiter:
+    """
+    Spread requests out so that no more than `rate` of them start per second,
+    no matter how many worker threads are asking.
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: Maximum number of requests per second. None or 0 disables the limit.
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """
+        Block until the caller is allowed to send its next request.
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def resolve_to_simbad_id(ra, dec, unit=(u.deg, u.deg), radius=5 * u.arcsec, cache=None, aliases=None):
+    """
+    Get the Simbad main identifier of the nearest object around a position.
+    :param ra: Right ascension, in `unit[0]` (a number or a sexagesimal string).
+    :param dec: Declination, in `unit[1]`.
+    :param unit: Units of ra and dec, e.g. (u.hourangle, u.deg) for "05 29 23.361" style strings.
+    :param radius: Cone search radius.
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it.
+    :return: The main_id, or None if nothing was found.
+    """
+    cache = resolve_cache(cache)
+    aliases = resolve_index(aliases)
+    coord = SkyCoord(ra=ra, dec=dec, unit=unit, frame='icrs')
+    hit, resolved = _cached_region_id(cache, coord, radius, aliases)
+    if hit:
+        return resolved
+    return _query_region_id(cache, coord, radius, aliases)
+
+
+def _cached_region_id(cache, coord, radius, aliases=None):
+    # The cone search itself (a cached "not found" is final, as in simbad_xmatch), then any object
+    # already resolved at (nearly) this position within the radius
+    hit, record = (False, None) if cache is None else \
+        cache.get_region(coord.ra.deg, coord.dec.deg, radius.to_value(u.arcsec), ['main_id'])
+    if hit:
+        return True, None if record is None else record['main_id']
+    known = None if aliases is None else aliases.lookup_position(coord.ra.deg, coord.dec.deg,
+                                                                 radius.to_value(u.arcsec))
+    return known is not None, known
+
+
+def _query_region_id(cache, coord, radius, aliases=None):
+    # Cone searches are cheap and idempotent, so a slow one gets a hedged duplicate
+    result = SIMBAD.call(Simbad.query_region, coord, radius=radius, operation='query_region', hedge=True)
+    resolved = None
+    if result is not None and len(result) > 0:
+        # The nearest object, like tiled mode and simbad_xmatch, since they share the cache entries
+        object_ra = np.ma.filled(np.ma.asarray(result['ra'], dtype=float), np.nan)
+        object_dec = np.ma.filled(np.ma.asarray(result['dec'], dtype=float), np.nan)
+        k = assign_nearest([coord.ra.deg], [coord.dec.deg], object_ra, object_dec, radius.to_value(u.arcsec))[0]
+        resolved = None if k < 0 else str(result['main_id'][k])
+    if cache is not None:
+        cache.put_region(coord.ra.deg, coord.dec.deg, radius.to_value(u.arcsec),
+                         None if resolved is None else {'main_id': resolved}, ['main_id'])
+    if aliases is not None and resolved is not None:
+        sep = coord.separation(SkyCoord(object_ra[k], object_dec[k], unit=u.deg)).arcsec
+        aliases.add_positions([(coord.ra.deg, coord.dec.deg, resolved, sep),
+                               (object_ra[k], object_dec[k], resolved, 0.)])
+    return resolved
+
+
+def resolve_positions(ra, dec, unit=(u.deg, u.deg), radius=5 * u.arcsec, failed_queries=None,
+                      max_workers=8, rate=5.0, cache=None, aliases=None, errors=None):
+    """
+    Resolve a list of positions to Simbad identifiers with concurrent cone searches.
+    :param ra: List of right ascensions.
+    :param dec: List of declinations.
+    :param unit: Units of ra and dec, passed on to SkyCoord.
+    :param radius: Cone search radius.
+    :param failed_queries: Optional list; (ra, dec) of every position that returned nothing or
+        raised is appended to it, in input order.
+    :param max_workers: Maximum number of cone searches in flight at once.
+    :param rate: Maximum number of cone searches started per second (be polite to CDS).
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it.
+    :param errors: Optional list; (ra, dec) of every position whose search raised is appended to it.
+    :return: List of identifiers (or None), aligned with the input positions.
+    """
+    limiter = RateLimiter(rate)
+    cache = resolve_cache(cache)
+    aliases = resolve_index(aliases)
+    progress = Progress(len(ra), 'query_region')
+
+    def query(position):
+        ra_i, dec_i = position
+        progress.update()
+        try:
+            coord = SkyCoord(ra=ra_i, dec=dec_i, unit=unit, frame='icrs')
+            hit, resolved = _cached_region_id(cache, coord, radius, aliases)
+            if hit:
+                # Negative entries count as failures too, so they still end up in failed_queries
+                return resolved, resolved is None, False
+            limiter.wait()  # Only real requests are rate limited
+            resolved = _query_region_id(cache, coord, radius, aliases)
+            if resolved is None:
+                print(f"⚠️ No results found for RA={ra_i}, Dec={dec_i}")
+            return resolved, resolved is None, False
+        except Exception as e:
+            print(f"Error resolving RA={ra_i}, Dec={dec_i}: {e}")
+            return None, True, True
+
+    # executor.map hands results back in input order regardless of completion order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(query, zip(ra, dec)))
+    progress.close()
+
+    resolved_ids = []
+    for (ra_i, dec_i), (resolved, failed, raised) in zip(zip(ra, dec), results):
+        if failed and failed_queries is not None:
+            failed_queries.append((ra_i, dec_i))  # Store failed queries
+        if raised and errors is not None:
+            errors.append((ra_i, dec_i))
+        resolved_ids.append(resolved)
+    return resolved_ids
+
+
+def resolve_positions_tiled(ra, dec, unit=(u.deg, u.deg), radius=5 * u.arcsec, failed_queries=None,
+                            max_workers=8, rate=5.0, cache=None, aliases=None, max_tile_radius=3 * u.arcmin,
+                            errors=None):
+    """
+    Resolve a list of positions to Simbad identifiers with one region query per group of nearby
+    positions (see tiling.plan_tiles) instead of one per position. Every object of a region comes
+    back at once and each position gets the nearest one within `radius`, so a cluster of hundreds
+    of targets costs a handful of requests.
+    :param ra: List of right ascensions.
+    :param dec: List of declinations.
+    :param unit: Units of ra and dec, passed on to SkyCoord.
+    :param radius: Match radius of each position.
+    :param failed_queries: Optional list; (ra, dec) of every position that returned nothing or
+        raised is appended to it, in input order.
+    :param max_workers: Maximum number of region queries in flight at once.
+    :param rate: Maximum number of region queries started per second.
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it. Results are
+        stored per position, and both modes keep the nearest object, so they are shared with
+        resolve_positions.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it.
+    :param max_tile_radius: Largest region query.
+    :param errors: Optional list; (ra, dec) of every position whose region query raised is appended to it.
+    :return: List of identifiers (or None), aligned with the input positions.
+    """
+    limiter = RateLimiter(rate)
+    cache = resolve_cache(cache)
+    aliases = resolve_index(aliases)
+    coords = SkyCoord(ra=ra, dec=dec, unit=unit, frame='icrs')
+    ra_deg, dec_deg = coords.ra.deg, coords.dec.deg
+    radius_arcsec = radius.to_value(u.arcsec)
+
+    resolved_ids = [None] * len(coords)
+    pending = []
+    for i in range(len(coords)):
+        hit, resolved_ids[i] = _cached_region_id(cache, coords[i], radius, aliases)
+        if not hit:
+            pending.append(i)
+    pending = np.array(pending, dtype=int)
+    tiles = plan_tiles(ra_deg[pending], dec_deg[pending], radius_arcsec, max_tile_radius.to_value(u.arcsec))
+    if len(pending):
+        print(f"{len(pending)} positions in {len(tiles)} region queries")
+    progress = Progress(len(pending), 'query_region (tiled)')
+
+    def query(tile):
+        members = pending[tile.members]
+        try:
+            limiter.wait()
+            center = SkyCoord(ra=tile.ra, dec=tile.dec, unit=u.deg, frame='icrs')
+            # A single position is an ordinary cheap cone search and gets hedged like one
+            result = SIMBAD.call(Simbad.query_region, center, radius=tile.radius * u.arcsec,
+                                 operation='query_region' if len(members) == 1 else 'query_region_tile',
+                                 hedge=len(members) == 1)
+        except Exception as e:
+            print(f"Error querying the {tile.radius:.0f}\" region around RA={tile.ra:.5f}, Dec={tile.dec:.5f}: {e}")
+            progress.update(len(members))
+            return members, None
+        ids = [None] * len(members)
+        if result is not None and len(result) > 0:
+            object_ra = np.ma.filled(np.ma.asarray(result['ra'], dtype=float), np.nan)
+            object_dec = np.ma.filled(np.ma.asarray(result['dec'], dtype=float), np.nan)
+            nearest = assign_nearest(ra_deg[members], dec_deg[members], object_ra, object_dec, radius_arcsec)
+            ids = [str(result['main_id'][k]) if k >= 0 else None for k in nearest]
+            if aliases is not None and (nearest >= 0).any():
+                # Both the catalog positions, with how far their object is, and Simbad's own positions
+                matched = np.flatnonzero(nearest >= 0)
+                seps = coords[members[matched]].separation(
+                    SkyCoord(object_ra[nearest[matched]], object_dec[nearest[matched]], unit=u.deg)).arcsec
+                aliases.add_positions([(ra_deg[members[j]], dec_deg[members[j]], ids[j], sep)
+                                       for j, sep in zip(matched, seps)] +
+                                      [(object_ra[k], object_dec[k], str(result['main_id'][k]), 0.)
+                                       for k in set(nearest[matched])])
+        if cache is not None:
+            for i, simbad_id in zip(members, ids):
+                cache.put_region(ra_deg[i], dec_deg[i], radius_arcsec,
+                                 None if simbad_id is None else {'main_id': simbad_id}, ['main_id'])
+        progress.update(len(members))
+        return members, ids
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for members, ids in executor.map(query, tiles):
+            if ids is not None:
+                for i, simbad_id in zip(members, ids):
+                    resolved_ids[i] = simbad_id
+            elif errors is not None:
+                errors.extend((ra[i], dec[i]) for i in members)
+    progress.close()
+
+    for i, resolved in enumerate(resolved_ids):
+        if resolved is None:
+            print(f"⚠️ No results found for RA={ra[i]}, Dec={dec[i]}")
+            if failed_queries is not None:
+                failed_queries.append((ra[i], dec[i]))
+    return resolved_ids
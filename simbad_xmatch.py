@@ -0,0 +1,165 @@
+import os
+import numpy as np
+from astropy.table import Table
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+from pyvo.dal import TAPService
+from metrics import Progress
+from alias_index import resolve_index
+from request_executor import SIMBAD
+from simbad_batch import query_objects_chunked
+from simbad_cache import resolve_cache
+
+# Point this at a local TAP stand-in (e.g. http://localhost:8000/simbad/sim-tap) to test offline
+SIMBAD_TAP_URL = os.environ.get('SIMBAD_TAP_URL', 'https://simbad.cds.unistra.fr/simbad/sim-tap')
+
+BANDS = ('G', 'J', 'H', 'K')
+
+# One positional join for the whole uploaded table. Every Simbad object inside the radius comes
+# back with its distance, the nearest one per row_id is kept on our side.
+XMATCH_QUERY = """
+SELECT t.row_id, b.main_id, b.ra, b.dec,
+       DISTANCE(POINT('ICRS', b.ra, b.dec), POINT('ICRS', t.ra, t.dec)) AS dist,
+       {band_columns}
+FROM TAP_UPLOAD.targets AS t
+JOIN basic AS b
+  ON 1 = CONTAINS(POINT('ICRS', b.ra, b.dec), CIRCLE('ICRS', t.ra, t.dec, {radius_deg}))
+{band_joins}
+"""
+
+
+def build_query(radius, bands=BANDS):
+    """
+    Build the ADQL cross-match query.
+    :param radius: Match radius (astropy Quantity).
+    :param bands: Flux filters to return, one LEFT JOIN on the flux table each.
+    :return: ADQL string.
+    """
+    band_columns = ', '.join(f'f{b}.flux AS "{b}"' for b in bands)
+    band_joins = '\n'.join(f"LEFT JOIN flux AS f{b} ON f{b}.oidref = b.oid AND f{b}.filter = '{b}'"
+                           for b in bands)
+    return XMATCH_QUERY.format(band_columns=band_columns, band_joins=band_joins,
+                               radius_deg=radius.to_value(u.deg))
+
+
+def _masked_to_none(value):
+    return None if np.ma.is_masked(value) else value
+
+
+def _fill_known(results, coords, known, bands, cache, aliases):
+    # Rows already resolved through the alias index: position and photometry by main_id
+    rows = list(known)
+    records = query_objects_chunked([known[i] for i in rows], ['main_id', 'ra', 'dec'] + list(bands),
+                                    cache=cache or False, aliases=aliases or False)
+    for k, i in enumerate(rows):
+        if records['main_id'][k] is None:
+            continue
+        results['main_id'][i] = records['main_id'][k]
+        for field in ('ra', 'dec') + tuple(bands):
+            results[field][i] = records[field][k]
+        if records['ra'][k] is not None and records['dec'][k] is not None:
+            results['sep'][i] = coords[i].separation(SkyCoord(records['ra'][k], records['dec'][k], unit=u.deg)).arcsec
+
+
+def crossmatch_positions(ra, dec, unit=(u.deg, u.deg), radius=5 * u.arcsec, bands=BANDS,
+                         chunk_size=5000, failed_queries=None, tap_url=None, cache=None, aliases=None,
+                         errors=None):
+    """
+    Cross-match a list of positions against Simbad with one TAP upload per chunk.
+    Replaces one query_region per row plus a query_objects call for the photometry.
+    :param ra: List of right ascensions.
+    :param dec: List of declinations.
+    :param unit: Units of ra and dec, passed on to SkyCoord.
+    :param radius: Match radius; the nearest object inside it is kept.
+    :param bands: Magnitudes to return.
+    :param chunk_size: Number of rows uploaded per request.
+    :param failed_queries: Optional list; (ra, dec) of every unmatched row is appended to it.
+    :param tap_url: TAP service to use. Default is SIMBAD_TAP_URL.
+    :param cache: SimbadCache to use. None uses the shared cache, False disables it.
+    :param aliases: AliasIndex to use. None uses the shared index, False disables it. Rows at the
+        position of an object resolved before are not uploaded; their photometry comes from one
+        batch query by main_id, usually answered by the cache.
+    :param errors: Optional list; (ra, dec) of every row whose upload raised is appended to it. Those
+        rows are in failed_queries too.
+    :return: Dictionary of lists aligned with the input: main_id, ra, dec, sep (arcsec) and one per band.
+    """
+    coords = SkyCoord(ra=ra, dec=dec, unit=unit, frame='icrs')
+    service = TAPService(tap_url or SIMBAD_TAP_URL)
+    query = build_query(radius, bands)
+    cache = resolve_cache(cache)
+    aliases = resolve_index(aliases)
+    radius_arcsec = radius.to_value(u.arcsec)
+
+    n = len(coords)
+    fields = ('main_id', 'ra', 'dec', 'sep') + tuple(bands)
+    results = {field: [None] * n for field in fields}
+    best_dist = [None] * n
+
+    # Only rows that are neither cached nor at a known object's position get uploaded
+    pending, known = [], {}
+    for i in range(n):
+        hit, record = (False, None) if cache is None else \
+            cache.get_region(coords.ra.deg[i], coords.dec.deg[i], radius_arcsec, fields)
+        # A cached "not found" is final, the alias index only answers cache misses
+        main_id = None if hit or aliases is None else \
+            aliases.lookup_position(coords.ra.deg[i], coords.dec.deg[i], radius_arcsec)
+        if main_id is not None:
+            known[i] = main_id
+        elif not hit:
+            pending.append(i)
+        elif record is not None:
+            for field in fields:
+                results[field][i] = record[field]
+    if n and not pending:
+        print(f"All {n} rows found in the cache.")
+    if known:
+        _fill_known(results, coords, known, bands, cache, aliases)
+    pending = np.array(pending, dtype=int)
+    progress = Progress(len(pending), 'crossmatch')
+
+    for start in range(0, len(pending), chunk_size):
+        rows = pending[start:start + chunk_size]
+        progress.update(len(rows))
+        targets = Table({'row_id': rows,
+                         'ra': coords.ra.deg[rows],
+                         'dec': coords.dec.deg[rows]})
+        try:
+            result_table = SIMBAD.call(lambda: service.run_sync(query, uploads={'targets': targets}).to_table(),
+                                       operation='tap_crossmatch')
+        except Exception as e:
+            print(f"Cross-match failed for rows {rows[0]}-{rows[-1]}: {e}")
+            if errors is not None:
+                errors.extend((ra[i], dec[i]) for i in rows)
+            continue
+        print(f"Cross-matched rows {rows[0]}-{rows[-1]}: {len(result_table)} candidate matches")
+
+        for row in result_table:
+            i = int(row['row_id'])
+            dist = float(row['dist'])
+            if best_dist[i] is not None and dist >= best_dist[i]:
+                continue
+            best_dist[i] = dist
+            results['main_id'][i] = str(row['main_id'])
+            results['ra'][i] = float(row['ra'])
+            results['dec'][i] = float(row['dec'])
+            results['sep'][i] = dist * 3600.
+            for band in bands:
+                results[band][i] = _masked_to_none(row[band])
+
+        if cache is not None:
+            for i in rows:
+                record = None if results['main_id'][i] is None else {field: results[field][i] for field in fields}
+                cache.put_region(coords.ra.deg[i], coords.dec.deg[i], radius_arcsec, record, fields)
+        if aliases is not None:
+            matched = [i for i in rows if results['main_id'][i] is not None]
+            aliases.add_positions([(coords.ra.deg[i], coords.dec.deg[i], results['main_id'][i], results['sep'][i])
+                                   for i in matched] +
+                                  [(results['ra'][i], results['dec'][i], results['main_id'][i], 0.) for i in matched])
+
+    for i in range(n):
+        if results['main_id'][i] is None:
+            print(f"⚠️ No results found for RA={ra[i]}, Dec={dec[i]}")
+            if failed_queries is not None:
+                failed_queries.append((ra[i], dec[i]))
+    progress.close()
+    return results
@@ -0,0 +1,517 @@
+import argparse
+import email
+import email.policy
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from astropy.io.votable import parse_single_table
+from astropy.table import Table, MaskedColumn
+
+# Clients are pointed at http://host:port/<service>/<path on the real host> (see reroute_session)
+SERVICES = ('simbad', 'eso', 'gemini')
+SERVICE_HOSTS = {'simbad': 'https://simbad.cds.unistra.fr',
+                 'eso': 'https://archive.eso.org',
+                 'gemini': 'https://archive.gemini.edu'}
+
+_CIRCLE_RE = re.compile(r"CIRCLE\(\s*'ICRS'\s*,\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*,\s*([-+\d.eE]+)\s*\)", re.I)
+_BANDS = ('G', 'J', 'H', 'K')
+_METADATA_RE = re.compile(r"\bTAP_SCHEMA\.|\bFROM\s+\"?filter\"?(\s|$)", re.I)
+
+# Tables the stand-in describes in /tables and TAP_SCHEMA: name -> (description, columns)
+TAP_TABLES = {
+    'simbad': {'basic': ('General data about an astronomical object',
+                         ('oid', 'main_id', 'ra', 'dec', 'coo_err_maj', 'coo_err_min', 'coo_bibcode', 'otype',
+                          'pmra', 'pmdec', 'plx_value', 'rvz_radvel', 'sp_type')),
+               'allfluxes': ('All fluxes of an object, one column per filter',
+                             ('oidref', 'U', 'B', 'V', 'R', 'I', 'G', 'J', 'H', 'K')),
+               'flux': ('Magnitude/flux information', ('oidref', 'filter', 'flux', 'flux_err', 'bibcode')),
+               'ident': ('Identifiers of an astronomical object', ('oidref', 'id')),
+               'ids': ('All identifiers of an object, separated by pipes', ('oidref', 'ids')),
+               'otypes': ('Object types of an astronomical object', ('oidref', 'otype')),
+               'filter': ('Description of a flux filter', ('filtername', 'description', 'unit'))},
+    'eso': {'dbo.raw': ('Raw frames of the ESO archive', ('dp_id', 'object', 'instrument', 'ra', 'dec'))},
+}
+SIMBAD_FILTERS = ('U', 'B', 'V', 'R', 'I', 'G', 'J', 'H', 'K')
+
+
+class ServiceBehaviour:
+    """
+    How a stand-in service misbehaves: latency, failures and throttling.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.5, error_rate=0., max_concurrent=None, match_rate=0.9):
+        """
+        :param latency: Median response time in seconds.
+        :param jitter: Sigma of the log-normal spread around the median (0 for a fixed latency).
+        :param error_rate: Fraction of requests answered with 503.
+        :param max_concurrent: Requests served at once; the ones beyond get 429. None for no limit.
+        :param match_rate: Fraction of synthetic objects/positions that are found.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.match_rate = match_rate
+
+    def delay(self, rng):
+        return self.latency * (rng.lognormvariate(0, self.jitter) if self.jitter else 1.)
+
+
+class ServiceStats:
+    """
+    Request counters of one service, safe to update from the handler threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def as_dict(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in
+                    ('requests', 'errors', 'throttled', 'bytes_in', 'bytes_out', 'max_in_flight')}
+
+
+def _unit_hash(*parts):
+    # Deterministic pseudo-random number in [0, 1) for a synthetic object
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def _synthetic_object(key, ra=None, dec=None):
+    # Main id, position and G/J/H/K for a synthetic object, stable for the same key
+    ra = 360. * _unit_hash(key, 'ra') if ra is None else ra
+    dec = 180. * _unit_hash(key, 'dec') - 90. if dec is None else dec
+    record = {'main_id': f"SYN J{ra:09.5f}{dec:+09.5f}", 'ra': ra, 'dec': dec}
+    base = 8. + 8. * _unit_hash(key, 'mag')
+    for offset, band in zip((3., 1., .5, .3), _BANDS):
+        record[band] = None if _unit_hash(key, band) < .1 else base + offset * _unit_hash(key, band, 'c')
+    return record
+
+
+def _votable_bytes(rows, columns):
+    table = Table()
+    for name in columns:
+        values = [row.get(name) for row in rows]
+        mask = [value is None for value in values]
+        if name in _BANDS or name in ('ra', 'dec', 'dist'):
+            table[name] = MaskedColumn([np.nan if value is None else value for value in values], dtype=float,
+                                       mask=mask)
+        elif name in ('row_id', 'object_number_id'):
+            table[name] = np.array(values, dtype=np.int64)
+        else:
+            # Variable-length strings (char arraysize="*") like the real services, which astropy reads as object
+            table[name] = np.array(['' if value is None else str(value) for value in values], dtype=object)
+    buffer = io.BytesIO()
+    table.write(buffer, format='votable')
+    return buffer.getvalue()
+
+
+def _form_fields(handler, body):
+    # TAP parameters and uploaded tables from a urlencoded or multipart POST
+    content_type = handler.headers.get('Content-Type', '')
+    fields, files = {}, {}
+    if content_type.startswith('multipart/'):
+        message = email.message_from_bytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body,
+                                           policy=email.policy.HTTP)
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True) or b''
+            if part.get_filename():
+                files[name] = payload
+            else:
+                fields[name.upper()] = payload.decode()
+    else:
+        query = body.decode() if body else urlsplit(handler.path).query
+        fields = {key.upper(): values[-1] for key, values in parse_qs(query).items()}
+    return fields, files
+
+
+def simbad_tap(fields, files, behaviour):
+    """
+    Answer the three query shapes used here: an upload cross-match (row_id, ra, dec), a
+    query_objects upload (user_specified_id) and a query_region CONTAINS/CIRCLE, plus the
+    metadata queries that come before them.
+    """
+    query = fields.get('QUERY', '')
+    if not files and _METADATA_RE.search(query):
+        return simbad_metadata(query, TAP_TABLES['simbad'])
+    uploads = {name: parse_single_table(io.BytesIO(data)).to_table() for name, data in files.items()}
+    rows = []
+    for upload in uploads.values():
+        if 'row_id' in upload.colnames:
+            radius = float(_CIRCLE_RE.search(query).group(3)) if _CIRCLE_RE.search(query) else 5 / 3600.
+            for row in upload:
+                key = (float(row['ra']), float(row['dec']))
+                if _unit_hash(key, 'found') < behaviour.match_rate:
+                    dist = radius * _unit_hash(key, 'dist')
+                    record = _synthetic_object(key, float(row['ra']), float(row['dec']) + dist)
+                    rows.append(dict(record, row_id=int(row['row_id']), dist=dist))
+            return _votable_bytes(rows, ('row_id', 'main_id', 'ra', 'dec', 'dist') + _BANDS)
+        if 'user_specified_id' in upload.colnames:
+            for number, row in enumerate(upload, start=1):
+                identifier = str(row['user_specified_id'])
+                if _unit_hash(identifier, 'found') < behaviour.match_rate:
+                    number = int(row['object_number_id']) if 'object_number_id' in upload.colnames else number
+                    rows.append(dict(_synthetic_object(identifier), user_specified_id=identifier,
+                                     object_number_id=number))
+            return _votable_bytes(rows, ('main_id', 'ra', 'dec') + _BANDS + ('user_specified_id', 'object_number_id'))
+
+    circle = _CIRCLE_RE.search(query)
+    if circle:
+        ra, dec, radius = (float(value) for value in circle.groups())
+        key = (round(ra, 6), round(dec, 6))
+        if _unit_hash(key, 'found') < behaviour.match_rate:
+            rows.append(_synthetic_object(key, ra, dec + radius * _unit_hash(key, 'dist')))
+    return _votable_bytes(rows, ('main_id', 'ra', 'dec') + _BANDS)
+
+
+def eso_tap(fields, files, behaviour):
+    """
+    Synthetic raw-frame rows for an ESO TAP query (astroquery >= 0.4.10 queries the archive through TAP).
+    """
+    query = fields.get('QUERY', '')
+    rows = []
+    if _unit_hash(query, 'found') < behaviour.match_rate / 3:
+        for i in range(1 + int(5 * _unit_hash(query, 'n'))):
+            rows.append({'dp_id': f"SPHER.2020-01-01T00:00:{i:02d}.000", 'object': 'SYNTHETIC',
+                         'instrument': 'SPHERE', 'ra': 360. * _unit_hash(query, 'ra'),
+                         'dec': 180. * _unit_hash(query, 'dec') - 90.})
+    return _votable_bytes(rows, ('dp_id', 'object', 'instrument', 'ra', 'dec'))
+
+
+def _select_names(query):
+    # Output column names of an ADQL SELECT: the alias, or the column name without table and quotes
+    select = re.search(r"\bSELECT\s+(?:DISTINCT\s+)?(?:TOP\s+\d+\s+)?(.*?)\s+FROM\b", query, re.I | re.S)
+    names, depth, item = [], 0, ''
+    for char in (select.group(1) + ',') if select else '':
+        depth += (char == '(') - (char == ')')
+        if char == ',' and depth == 0:
+            alias = re.search(r"\bAS\s+\"?(\w+)\"?\s*$", item, re.I)
+            names.append(alias.group(1) if alias else item.strip().split('.')[-1].strip('"'))
+            item = ''
+        else:
+            item += char
+    return names
+
+
+def simbad_metadata(query, tables):
+    """
+    Answer the metadata queries astroquery >= 0.4.8 runs before building a query (list_votable_fields,
+    list_columns, the filter names): TAP_SCHEMA.tables/keys, TAP_SCHEMA.columns and the filter table.
+    """
+    if re.search(r"\bTAP_SCHEMA\.columns\b", query, re.I):
+        wanted = re.findall(r"'(\w+)'", query.split('WHERE', 1)[-1]) or list(tables)
+        rows = [{'table_name': table, 'column_name': column, 'name': column, 'description': column,
+                 'datatype': 'DOUBLE' if column in _BANDS + ('ra', 'dec') else 'VARCHAR', 'unit': '', 'ucd': ''}
+                for table in wanted if table in tables for column in tables[table][1]]
+    elif re.search(r"\bTAP_SCHEMA\.", query, re.I):
+        rows = [{'table_name': table, 'name': table, 'description': description, 'schema_name': 'public',
+                 'table_type': 'table', 'from_table': table, 'target_table': 'basic'}
+                for table, (description, _) in tables.items() if table != 'basic']
+    else:
+        rows = [{'filtername': band, 'name': band, 'description': f"{band} magnitude", 'unit': 'mag'}
+                for band in SIMBAD_FILTERS]
+    names = [name for name in _select_names(query) if name != '*'] or (list(rows[0]) if rows else ['name'])
+    return _votable_bytes([{name: row.get(name, '') for name in names} for row in rows], names)
+
+
+def tap_capabilities(base_url):
+    """
+    VOSI capabilities of a TAP service, which pyvo reads for the output limits.
+    """
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<vosi:capabilities xmlns:vosi="http://www.ivoa.net/xml/VOSICapabilities/v1.0"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:vs="http://www.ivoa.net/xml/VODataService/v1.1"
+    xmlns:tr="http://www.ivoa.net/xml/TAPRegExt/v1.0">
+  <capability standardID="ivo://ivoa.net/std/VOSI#capabilities">
+    <interface xsi:type="vs:ParamHTTP"><accessURL use="full">{base_url}/capabilities</accessURL></interface>
+  </capability>
+  <capability standardID="ivo://ivoa.net/std/VOSI#tables">
+    <interface xsi:type="vs:ParamHTTP"><accessURL use="full">{base_url}/tables</accessURL></interface>
+  </capability>
+  <capability standardID="ivo://ivoa.net/std/TAP" xsi:type="tr:TableAccess">
+    <interface role="std" xsi:type="vs:ParamHTTP"><accessURL use="base">{base_url}</accessURL></interface>
+    <language>
+      <name>ADQL</name>
+      <version ivo-id="ivo://ivoa.net/std/ADQL#v2.0">2.0</version>
+      <description>ADQL 2.0</description>
+    </language>
+    <outputFormat><mime>application/x-votable+xml</mime><alias>votable</alias></outputFormat>
+    <uploadMethod ivo-id="ivo://ivoa.net/std/TAPRegExt#upload-inline"/>
+    <outputLimit><default unit="row">10000</default><hard unit="row">2000000</hard></outputLimit>
+    <uploadLimit><hard unit="byte">200000000</hard></uploadLimit>
+  </capability>
+</vosi:capabilities>
+""".encode()
+
+
+def tap_tables(tables):
+    """
+    VOSI tableset of a TAP service.
+    """
+    described = ''.join(
+        f'<table type="table"><name>{table}</name><description>{description}</description>' +
+        ''.join(f'<column><name>{column}</name><dataType xsi:type="vs:TAPType">'
+                f"{'DOUBLE' if column in _BANDS + ('ra', 'dec') else 'VARCHAR'}</dataType></column>"
+                for column in columns) + '</table>'
+        for table, (description, columns) in tables.items())
+    return (f"""<?xml version="1.0" encoding="UTF-8"?>
+<vosi:tableset xmlns:vosi="http://www.ivoa.net/xml/VOSITables/v1.0"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xmlns:vs="http://www.ivoa.net/xml/VODataService/v1.1">
+  <schema><name>public</name>{described}</schema>
+</vosi:tableset>
+""").encode()
+
+
+def eso_wdb_form(path):
+    """
+    The query form of an ESO archive instrument page (/wdb/wdb/eso/<instrument>/form), with the
+    inputs Eso.query_instrument fills in. It posts back to the stand-in.
+    """
+    return f"""<html><body>
+<form id="queryform" name="queryform" method="post" action="query">
+  <input type="hidden" name="wdbo" value="html/display">
+  <input type="text" name="target" value="">
+  <input type="text" name="resolver" value="simbad">
+  <input type="text" name="max_rows_returned" value="200">
+  <input type="checkbox" name="tab_dp_id" checked>
+  <input type="hidden" name="instrument" value="{path.rstrip('/').split('/')[-2].upper()}">
+</form>
+</body></html>
+""".encode()
+
+
+def eso_wdb(fields, behaviour):
+    """
+    Synthetic CSV answer of an ESO archive query form. The first line is skipped by the client.
+    """
+    target = fields.get('TARGET', '')
+    lines = ['', f"# Stand-in ESO archive query for {target}"]
+    if _unit_hash(target, 'found') < behaviour.match_rate / 3:
+        lines.append('Object,DP.ID,Instrument,RA,DEC')
+        for i in range(1 + int(5 * _unit_hash(target, 'n'))):
+            lines.append(f"SYNTHETIC,SPHER.2020-01-01T00:00:{i:02d}.000,{fields.get('INSTRUMENT', 'SPHERE')},"
+                         f"{360. * _unit_hash(target, 'ra'):.6f},{180. * _unit_hash(target, 'dec') - 90.:.6f}")
+    else:
+        lines.append('# No data returned !')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def gemini_jsonsummary(path, behaviour):
+    """
+    Synthetic jsonsummary results, the format Gemini Observations.query_criteria reads.
+    """
+    rows = []
+    if _unit_hash(path, 'found') < behaviour.match_rate / 3:
+        for i in range(1 + int(3 * _unit_hash(path, 'n'))):
+            rows.append({'name': f"S20200101S{i:04d}.fits", 'data_label': f"GS-2020A-Q-1-1-{i:03d}",
+                         'instrument': 'GPI', 'object': 'SYNTHETIC', 'ut_datetime': '2020-01-01 00:00:00',
+                         'ra': 360. * _unit_hash(path, 'ra'), 'dec': 180. * _unit_hash(path, 'dec') - 90.})
+    return json.dumps(rows).encode()
+
+
+class StandinServer(ThreadingHTTPServer):
+    """
+    Local stand-in for Simbad TAP, ESO TAP and query forms, and Gemini jsonsummary. Answers are
+    synthetic (stable for the same query) or replayed from record_dir, after a configurable delay,
+    with configurable errors and throttling per service.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, behaviours=None, record_dir=None, record=False, seed=0):
+        """
+        :param address: (host, port). Port 0 picks a free port.
+        :param behaviours: Dictionary of service name to ServiceBehaviour.
+        :param record_dir: Directory of recorded responses, <service>/<request hash>.
+        :param record: Forward requests without a recording to the real service and save the answer.
+        :param seed: Seed of the latency/error random numbers.
+        """
+        super().__init__(address, StandinHandler)
+        self.behaviours = {name: ServiceBehaviour() for name in SERVICES}
+        self.behaviours.update(behaviours or {})
+        self.stats = {name: ServiceStats() for name in SERVICES}
+        self.record_dir = record_dir
+        self.record = record
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stats_dict(self):
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+    def start(self):
+        """
+        Serve from a background thread; returns the thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(b'')
+
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, body):
+        server = self.server
+        path = urlsplit(self.path).path
+        if path == '/_stats':
+            return self._send(200, json.dumps(server.stats_dict()).encode(), 'application/json')
+        service = path.strip('/').split('/')[0]
+        if service not in SERVICES:
+            return self._send(404, b'unknown service', 'text/plain')
+
+        behaviour, stats = server.behaviours[service], server.stats[service]
+        with server._rng_lock:
+            delay, failure = behaviour.delay(server.rng), server.rng.random() < behaviour.error_rate
+        with stats._lock:
+            stats.requests += 1
+            stats.bytes_in += len(body)
+            throttled = behaviour.max_concurrent is not None and stats.in_flight >= behaviour.max_concurrent
+            if throttled:
+                stats.throttled += 1
+            else:
+                stats.in_flight += 1
+                stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        if throttled:
+            return self._send(429, b'Too many requests', 'text/plain')
+        try:
+            time.sleep(delay)
+            if failure:
+                with stats._lock:
+                    stats.errors += 1
+                return self._send(503, b'Service temporarily unavailable', 'text/plain')
+            status, payload, content_type = self._answer(service, path, body)
+            with stats._lock:
+                stats.bytes_out += len(payload)
+            self._send(status, payload, content_type)
+        finally:
+            with stats._lock:
+                stats.in_flight -= 1
+
+    def _answer(self, service, path, body):
+        server = self.server
+        key = hashlib.sha1(self.command.encode() + self.path.encode() + body).hexdigest()[:20]
+        recording = os.path.join(server.record_dir, service, key) if server.record_dir else None
+        if recording and os.path.exists(recording):
+            with open(recording, 'rb') as file:
+                content_type, _, payload = file.read().partition(b'\n')
+            return 200, payload, content_type.decode()
+        if recording and server.record:
+            url = SERVICE_HOSTS[service] + self.path[len(service) + 1:]
+            response = requests.request(self.command, url, data=body or None,
+                                        headers={'Content-Type': self.headers.get('Content-Type', '')}, timeout=300)
+            content_type = response.headers.get('Content-Type', 'application/octet-stream')
+            if response.ok:
+                os.makedirs(os.path.dirname(recording), exist_ok=True)
+                with open(recording, 'wb') as file:
+                    file.write(content_type.encode() + b'\n' + response.content)
+            return response.status_code, response.content, content_type
+
+        behaviour = server.behaviours[service]
+        if service == 'gemini':
+            return 200, gemini_jsonsummary(path, behaviour), 'application/json'
+        if service == 'eso' and '/wdb/' in path:
+            if self.command == 'GET' and path.endswith('/form'):
+                return 200, eso_wdb_form(path), 'text/html'
+            return 200, eso_wdb(_form_fields(self, body)[0], behaviour), 'text/csv'
+        if path.endswith('/capabilities'):
+            return 200, tap_capabilities(server.url + path[:-len('/capabilities')]), 'text/xml'
+        if path.endswith('/tables'):
+            return 200, tap_tables(TAP_TABLES[service]), 'text/xml'
+        fields, files = _form_fields(self, body)
+        if fields.get('REQUEST', 'doQuery').lower() != 'doquery' or not path.endswith('/sync'):
+            return 404, b'only synchronous TAP queries are served', 'text/plain'
+        answer = simbad_tap if service == 'simbad' else eso_tap
+        return 200, answer(fields, files, behaviour), 'application/x-votable+xml'
+
+
+def reroute_session(session, service, standin_url):
+    """
+    Send every request a requests.Session makes to a service's real host to the stand-in instead.
+    Works for the astroquery clients, whose URLs are fixed http or https addresses, e.g.
+    reroute_session(Simbad._session, 'simbad', server.url).
+    """
+    host = urlsplit(SERVICE_HOSTS[service]).netloc
+
+    class RerouteAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = f"{standin_url}/{service}{request.url.split(host, 1)[1]}"
+            return super().send(request, **kwargs)
+
+    # Some clients still use plain http for part of a service (e.g. the ESO query forms)
+    for scheme in ('https://', 'http://'):
+        session.mount(scheme + host, RerouteAdapter())
+
+
+def main():
+    # e.g. python standin_server.py --port 8000 --latency 0.5 --error-rate 0.05 --max-concurrent 10
+    # then SIMBAD_TAP_URL=http://localhost:8000/simbad/simbad/sim-tap python get_targets_SODA.py
+    parser = argparse.ArgumentParser(description='Local Simbad/ESO/Gemini stand-in with injected latency and errors.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.2, help='Median latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Log-normal sigma of the latency')
+    parser.add_argument('--error-rate', type=float, default=0., help='Fraction of requests answered with 503')
+    parser.add_argument('--max-concurrent', type=int, default=None, help='Requests per service beyond this get 429')
+    parser.add_argument('--match-rate', type=float, default=0.9, help='Fraction of objects found')
+    parser.add_argument('--config', help='JSON file of per-service settings, e.g. {"eso": {"latency": 2}}')
+    parser.add_argument('--record-dir', help='Directory of recorded responses to replay')
+    parser.add_argument('--record', action='store_true', help='Forward misses to the real services and record them')
+    args = parser.parse_args()
+
+    default = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                   max_concurrent=args.max_concurrent, match_rate=args.match_rate)
+    overrides = {}
+    if args.config:
+        with open(args.config, 'r') as file:
+            overrides = json.load(file)
+    behaviours = {name: ServiceBehaviour(**dict(default, **overrides.get(name, {}))) for name in SERVICES}
+    server = StandinServer((args.host, args.port), behaviours, record_dir=args.record_dir, record=args.record)
+    print(f"Serving Simbad/ESO/Gemini stand-ins on {server.url} (stats at {server.url}/_stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats_dict(), indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+import os
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from catalog_cache import load_catalog
+from cds_table import iter_cds_table, read_cds_table
+from metrics import METRICS, Progress
+from vizier_tsv import iter_vizier_tsv, read_vizier_tsv
+from pipeline import Stage, run_stages, PIPELINE_CACHE_DIR
+from query_objects import get_info
+from selection import compile_selection, select
+from simbad_batch import query_objects_chunked
+from simbad_cache import DEFAULT_TTL
+from simbad_resolver import resolve_positions, resolve_positions_tiled
+from simbad_xmatch import crossmatch_positions
+
+base_path = os.path.dirname(os.path.abspath(__file__))
+
+BANDS = ('G', 'J', 'H', 'K')
+OUTPUT_FIELDS = ('name', 'ra', 'dec') + BANDS
+READERS = {'vizier_tsv': read_vizier_tsv, 'cds': read_cds_table}
+STREAM_READERS = {'vizier_tsv': iter_vizier_tsv, 'cds': iter_cds_table}
+RETRY_RADII = (2., 5., 10.)  # arcsec
+STREAM_BATCH_SIZE = 5000
+
+
+# Stage functions. Each takes the previous stage's rows (a dict of lists) and returns new rows.
+
+def parse_catalog(_, catalog, reader, columns, name_column=None, name_prefix='', ra_column=None, dec_column=None,
+                  local_columns=None):
+    """
+    Read the survey catalog: identifiers (name_prefix + name_column) or positions (ra_column,
+    dec_column), plus any values taken from the catalog itself (local_columns, field -> column).
+    Rows without a name are dropped.
+    """
+    table = load_catalog(os.path.join(base_path, catalog), READERS[reader], columns=columns)
+    rows = catalog_rows(table, name_column, name_prefix, ra_column, dec_column, local_columns)
+    print(f"{len(table)} sources in {catalog}")
+    return rows
+
+
+def catalog_rows(table, name_column=None, name_prefix='', ra_column=None, dec_column=None, local_columns=None):
+    """
+    Rows of a catalog table (or a batch of one), see parse_catalog.
+    """
+    rows = {}
+    if name_column is not None:
+        table = table[~np.ma.getmaskarray(table[name_column])]
+        rows['identifier'] = [name_prefix + str(name) for name in table[name_column]]
+    if ra_column is not None:
+        rows['ra'], rows['dec'] = table[ra_column].tolist(), table[dec_column].tolist()
+    for field, column in (local_columns or {}).items():
+        rows[field] = table[column].tolist()
+    return rows
+
+
+def resolve_sources(rows, resolve_mode, unit, radius_arcsec, bands):
+    """
+    Find every source in Simbad, by identifier (one chunked query_objects, which also returns the
+    photometry) or by position ('tap' upload cross-match with photometry, 'cone' searches, or
+    'tiled' region queries shared by nearby positions).
+    Adds 'name' (label written to the output), 'failed' (not found or not asked), 'errors' (the
+    requests that raised) and whatever photometry came along.
+    """
+    rows = dict(rows)
+    errors = []
+    if 'identifier' in rows:
+        fields = ['main_id'] + [field for field in ('ra', 'dec') + tuple(bands) if field not in rows]
+        results = query_objects_chunked(rows['identifier'], fields, chunk_size=200, errors=errors)
+        rows['failed'] = [name for name, simbad_id in zip(rows['identifier'], results['main_id']) if simbad_id is None]
+        for name in rows['failed']:
+            print(f"Could not resolve {name} to a Simbad identifier")
+        rows['name'] = rows['identifier']
+        rows['errors'] = errors
+        rows.update({field: results[field] for field in fields})
+        return rows
+
+    unit = tuple(u.Unit(part) for part in unit)
+    radius = radius_arcsec * u.arcsec
+    failed_queries = []
+    if resolve_mode == 'tap':
+        # Single TAP upload cross-match, nearest Simbad object within the radius
+        matches = crossmatch_positions(rows['ra'], rows['dec'], unit=unit, radius=radius, bands=bands,
+                                       failed_queries=failed_queries, errors=errors)
+        rows['name'] = matches['main_id']
+        rows.update({band: matches[band] for band in bands})
+    elif resolve_mode == 'tiled':
+        # Nearby positions share one larger region query, matched back to the nearest object locally
+        rows['name'] = resolve_positions_tiled(rows['ra'], rows['dec'], unit=unit, radius=radius,
+                                               failed_queries=failed_queries, max_workers=8, rate=5.0,
+                                               errors=errors)
+    else:
+        # Cone searches run concurrently (max_workers in flight, at most `rate` per second)
+        rows['name'] = resolve_positions(rows['ra'], rows['dec'], unit=unit, radius=radius,
+                                         failed_queries=failed_queries, max_workers=8, rate=5.0, errors=errors)
+    rows['failed'] = failed_queries
+    rows['errors'] = errors
+    return rows
+
+
+def no_request_errors(rows):
+    """
+    Whether every request of the resolve stage got an answer. Only then is its output memoized, so
+    a run made while Simbad was down is not replayed by the next one. Sources Simbad does not know
+    are an answer, and are asked again once the stage's ttl runs out.
+    """
+    return not rows['errors']
+
+
+def add_photometry(rows, bands):
+    """
+    Query the magnitudes the resolve stage did not return, for the resolved names.
+    """
+    missing = [band for band in bands if band not in rows]
+    if not missing:
+        return rows
+    photometry = get_info(rows['name'], *missing, save_tsv=False)
+    return dict(rows, **{band: photometry[band] for band in missing})
+
+
+def filter_sources(rows, expression, parameters):
+    """
+    Indices of the rows passing the selection expression (see selection.Selection).
+    """
+    bands = {band: rows[band] for band in BANDS if band in rows}
+    return dict(rows, selected=select(expression, bands, **parameters).tolist())
+
+
+def format_source(rows, i, delimiter=' '):
+    """
+    Output line of row i: name, ra, dec and the magnitudes.
+    """
+    return delimiter.join(str(rows[field][i]) for field in OUTPUT_FIELDS) + "\n"
+
+
+def write_sources(rows, output, delimiter=' ', failed_queries=None):
+    """
+    Write name, ra, dec and the magnitudes of the selected rows, and the failed positions if asked.
+    """
+    if failed_queries is not None:
+        filename = os.path.join(base_path, failed_queries)
+        with open(filename, "w") as f:
+            for failed in rows['failed']:
+                f.write(f"{failed[0]} {failed[1]}\n")
+        print(f"\nFailed queries saved to {filename}")
+
+    with open(os.path.join(base_path, output), 'w') as file:
+        for i in rows['selected']:
+            file.write(format_source(rows, i, delimiter))
+    print(f"New file '{os.path.basename(output)}' created successfully ({len(rows['selected'])} sources).")
+    return rows
+
+
+class Survey:
+    """
+    Configuration of one survey's target selection: parse -> resolve -> photometry -> filter -> write.
+    """
+
+    def __init__(self, name, catalog, output, selection, reader='vizier_tsv', name_column=None, name_prefix='',
+                 ra_column=None, dec_column=None, unit=('deg', 'deg'), radius=5 * u.arcsec, local_columns=None,
+                 delimiter=' ', failed_queries=None):
+        """
+        :param name: Survey name, e.g. 'soda'.
+        :param catalog: Catalog file, relative to the repository.
+        :param output: Output file, relative to the repository.
+        :param selection: Selection expression, e.g. 'G > G_limit & H < H_limit'.
+        :param reader: 'vizier_tsv' or 'cds'.
+        :param name_column: Column of identifiers to resolve by name.
+        :param name_prefix: Prefix added to the identifiers, e.g. '2MASS '.
+        :param ra_column: Column of right ascensions to resolve by position (with dec_column).
+        :param dec_column: Column of declinations.
+        :param unit: Units of the positions, as strings, e.g. ('deg', 'deg').
+        :param radius: Match radius for position resolution.
+        :param local_columns: Values taken from the catalog instead of Simbad, e.g. {'G': 'Gmag'}.
+        :param delimiter: Output column delimiter.
+        :param failed_queries: File for the positions that could not be resolved, relative to the repository.
+        """
+        self.name = name
+        self.catalog = catalog
+        self.output = output
+        self.selection = selection
+        self.reader = reader
+        self.name_column = name_column
+        self.name_prefix = name_prefix
+        self.ra_column = ra_column
+        self.dec_column = dec_column
+        self.unit = list(unit)
+        self.radius = radius
+        self.local_columns = local_columns or {}
+        self.delimiter = delimiter
+        self.failed_queries = failed_queries
+
+    def parameters(self):
+        """
+        Names of the parameters of the selection expression, e.g. ['G_limit', 'H_limit'].
+        """
+        return [name for name in compile_selection(self.selection).names if name not in BANDS]
+
+    def columns(self):
+        """
+        Catalog columns the survey reads.
+        """
+        columns = [column for column in (self.name_column, self.ra_column, self.dec_column) if column is not None]
+        return columns + [column for column in self.local_columns.values() if column not in columns]
+
+    def resolve_params(self, resolve_mode='tap'):
+        """
+        Keyword arguments of resolve_sources for this survey.
+        """
+        return {'resolve_mode': resolve_mode if self.name_column is None else 'name',
+                'unit': self.unit, 'radius_arcsec': self.radius.to_value(u.arcsec), 'bands': list(BANDS)}
+
+    def stages(self, resolve_mode='tap', **parameters):
+        """
+        Pipeline stages for the given selection parameters.
+        """
+        parse_params = {'catalog': self.catalog, 'reader': self.reader, 'columns': self.columns(),
+                        'name_column': self.name_column, 'name_prefix': self.name_prefix,
+                        'ra_column': self.ra_column, 'dec_column': self.dec_column,
+                        'local_columns': self.local_columns}
+        resolve_params = self.resolve_params(resolve_mode)
+        return [Stage('parse', parse_catalog, parse_params, files=[os.path.join(base_path, self.catalog)]),
+                # Network stages: a resolve without request errors is kept as long as the Simbad cache
+                # keeps its answers, photometry is always asked again (the Simbad cache answers it)
+                Stage('resolve', resolve_sources, resolve_params, ttl=DEFAULT_TTL, memoize_if=no_request_errors),
+                Stage('photometry', add_photometry, {'bands': list(BANDS)}, memoize=False),
+                Stage('filter', filter_sources, {'expression': self.selection, 'parameters': parameters}),
+                Stage('write', write_sources, {'output': self.output, 'delimiter': self.delimiter,
+                                               'failed_queries': self.failed_queries}, memoize=False)]
+
+
+SURVEYS = {survey.name: survey for survey in [
+    Survey('orion', 'orion_sources.tsv', 'orion_sources_rev.txt', 'G > G_limit & H < H_limit',
+           name_column='SimbadName'),
+    Survey('taurus', 'taurus_sources.txt', 'taurus_sources_rev.txt', 'G > G_limit & H < H_limit',
+           reader='cds', name_column='2MASS', name_prefix='2MASS ',
+           local_columns={'ra': 'RAdeg', 'dec': 'DEdeg', 'G': 'Gmag'}),
+    Survey('taurus_classII', os.path.join('disk_survey_data', 'taurus', 'Taurus_ClassII.tsv'),
+           os.path.join('disk_survey_data', 'taurus', 'taurus_sources_rev.txt'), 'G > G_limit & H < H_limit',
+           name_column='2MASS', name_prefix='2MASS '),
+    Survey('soda', os.path.join('disk_survey_data', 'orion', 'SODA_I.tsv'),
+           os.path.join('disk_survey_data', 'orion', 'orion_sources_rev.txt'), 'H < H_limit',
+           ra_column='_RAJ2000', dec_column='_DEJ2000', radius=5 * u.arcsec,
+           failed_queries=os.path.join('disk_survey_data', 'orion', 'failed_queries_SODA.txt')),
+    # read_vizier_tsv converts the h:m:s / d:m:s columns to degrees
+    Survey('vision', os.path.join('disk_survey_data', 'orion', 'VISION_III.tsv'),
+           os.path.join('disk_survey_data', 'orion', 'orion_vision_sources_rev.txt'), 'G > G_limit & H < H_limit',
+           ra_column='RAJ2000', dec_column='DEJ2000', radius=2 * u.arcsec,
+           failed_queries=os.path.join('disk_survey_data', 'orion', 'failed_queries_VISION.txt')),
+    Survey('odisea', os.path.join('disk_survey_data', 'ophiuchus', 'ODISEA_I.tsv'),
+           os.path.join('disk_survey_data', 'ophiuchus', 'ophiuchus_odisea_sources_rev.tsv'), 'H < H_limit',
+           ra_column='_RAJ2000', dec_column='_DEJ2000', radius=5 * u.arcsec, delimiter='\t',
+           failed_queries=os.path.join('disk_survey_data', 'ophiuchus', 'failed_queries_ODISEA.txt')),
+]}
+
+
+def run_survey(name, resolve_mode='tap', use_cache=True, cache_dir=PIPELINE_CACHE_DIR, metrics=True, stream=False,
+               batch_size=STREAM_BATCH_SIZE, **parameters):
+    """
+    Run a survey's pipeline, reusing every stage whose inputs did not change since the last run.
+    :param name: Survey name (see SURVEYS).
+    :param resolve_mode: 'tap', 'cone' or 'tiled' for surveys resolved by position.
+    :param use_cache: Set to False to rerun every stage instead of reusing their stored outputs.
+        The Simbad cache is still used.
+    :param cache_dir: Directory of the stage outputs (one subdirectory per survey).
+    :param parameters: Selection parameters, e.g. G_limit=12, H_limit=9.
+    :param metrics: Write the run's metrics report (see metrics.Metrics.write_report).
+    :param stream: Read the catalog lazily and run every stage batch by batch (see stream_survey)
+        instead of through the memoized pipeline.
+    :param batch_size: Number of catalog rows per batch when streaming.
+    :return: Rows of the last stage (dict of lists, with 'selected' indices), or the number of
+        sources written when streaming.
+    """
+    survey = SURVEYS[name]
+    missing = [parameter for parameter in survey.parameters() if parameters.get(parameter) is None]
+    if missing:
+        raise ValueError(f"{name}: {', '.join(missing)} must be given")
+    parameters = {parameter: parameters[parameter] for parameter in survey.parameters()}
+    if stream:
+        return stream_survey(survey, resolve_mode, batch_size, metrics, **parameters)
+    METRICS.reset()
+    try:
+        return run_stages(survey.stages(resolve_mode, **parameters), cache_dir=os.path.join(cache_dir, name),
+                          use_cache=use_cache)
+    finally:
+        if metrics:
+            METRICS.write_report(f"survey_{name}")
+
+
+def stream_survey(survey, resolve_mode='tap', batch_size=STREAM_BATCH_SIZE, metrics=True, **parameters):
+    """
+    Run a survey batch by batch: the catalog is read lazily, and every batch of `batch_size` rows
+    is resolved, completed with photometry, filtered and appended to the output before the next
+    one is read. Memory stays bounded by one batch whatever the size of the catalog, and the
+    first sources are in the output after the first batch. Nothing is memoized, but the Simbad
+    cache still saves the requests of rows seen before.
+    :param survey: Survey.
+    :param resolve_mode: 'tap', 'cone' or 'tiled' for surveys resolved by position.
+    :param batch_size: Number of catalog rows per batch.
+    :param metrics: Write the run's metrics report.
+    :param parameters: Selection parameters, e.g. H_limit=9.
+    :return: Number of sources written.
+    """
+    catalog = os.path.join(base_path, survey.catalog)
+    output = os.path.join(base_path, survey.output)
+    failed_path = None if survey.failed_queries is None else os.path.join(base_path, survey.failed_queries)
+    resolve_params = survey.resolve_params(resolve_mode)
+    batches = STREAM_READERS[survey.reader](catalog, columns=survey.columns(), batch_size=batch_size)
+    progress = Progress(None, f"{survey.name} rows")
+    total = written = failed = 0
+    METRICS.reset()
+    try:
+        with open(output, 'w') as out, open(failed_path or os.devnull, 'w') as failed_file:
+            for table in batches:
+                with METRICS.stage('parse'):
+                    rows = catalog_rows(table, survey.name_column, survey.name_prefix, survey.ra_column,
+                                        survey.dec_column, survey.local_columns)
+                with METRICS.stage('resolve'):
+                    rows = resolve_sources(rows, **resolve_params)
+                with METRICS.stage('photometry'):
+                    rows = add_photometry(rows, BANDS)
+                with METRICS.stage('filter'):
+                    rows = filter_sources(rows, survey.selection, parameters)
+                with METRICS.stage('write'):
+                    out.writelines(format_source(rows, i, survey.delimiter) for i in rows['selected'])
+                    out.flush()
+                    if failed_path:
+                        failed_file.writelines(f"{ra_i} {dec_i}\n" for ra_i, dec_i in rows['failed'])
+                total += len(rows['name'])
+                written += len(rows['selected'])
+                failed += len(rows['failed'])
+                print(f"{total} rows done, {written} sources written")
+                progress.update(len(rows['name']))
+    finally:
+        progress.close()
+        if metrics:
+            METRICS.write_report(f"survey_{survey.name}_stream")
+    if failed_path:
+        print(f"\n{failed} failed queries saved to {failed_path}")
+    print(f"New file '{os.path.basename(output)}' created successfully ({written} sources).")
+    return written
+
+
+def read_failed_queries(filename):
+    """
+    Positions saved by write_sources, one "ra dec" line each, or "hh mm ss.s +dd mm ss.s" as the
+    original per-survey scripts wrote them (converted to degrees).
+    :return: (ra, dec, unparsed): the positions, as they were read from the catalog, and the lines
+        that are not a position (e.g. "None None" for a masked one), which are reported.
+    """
+    ra, dec, unparsed = [], [], []
+    with open(filename, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+            try:
+                if len(parts) == 2:
+                    ra_i, dec_i = float(parts[0]), float(parts[1])
+                elif len(parts) == 6:
+                    coord = SkyCoord(' '.join(parts), unit=(u.hourangle, u.deg))
+                    ra_i, dec_i = float(coord.ra.deg), float(coord.dec.deg)
+                else:
+                    raise ValueError(line)
+            except ValueError:
+                unparsed.append(line.rstrip('\n'))
+                continue
+            if np.isfinite(ra_i) and np.isfinite(dec_i):
+                ra.append(ra_i)
+                dec.append(dec_i)
+            else:
+                unparsed.append(line.rstrip('\n'))
+    if unparsed:
+        print(f"⚠️ {len(unparsed)} lines of {filename} are not positions and are skipped, e.g. {unparsed[0]!r}")
+    return ra, dec, unparsed
+
+
+def merge_sources(output, rows, delimiter=' '):
+    """
+    Write the selected rows into an existing output file in place: a line with the same name is
+    replaced, new names are appended. The file is replaced atomically.
+    :return: Number of lines added or replaced.
+    """
+    lines = {}
+    if os.path.exists(output):
+        with open(output, 'r') as file:
+            for line in file:
+                # Names may contain the delimiter, the other fields never do
+                name = line.rstrip('\n').rsplit(delimiter, len(OUTPUT_FIELDS) - 1)[0]
+                lines[name] = line
+    for i in rows['selected']:
+        lines[str(rows['name'][i])] = format_source(rows, i, delimiter)
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.writelines(lines.values())
+    os.replace(tmp_path, output)
+    return len(rows['selected'])
+
+
+def reprocess_failed(name, resolve_mode='tap', radii=RETRY_RADII, **parameters):
+    """
+    Query only the positions of a survey's failed_queries file again, with a widening radius:
+    first the survey's own radius (which recovers requests that failed on the network), then every
+    larger radius of `radii`. Recovered sources get their photometry, go through the survey's
+    selection and are merged into the existing output; the failed file is rewritten with the
+    positions still not found. A later full run resolves at the survey's radius again.
+    :param name: Survey name (see SURVEYS), one resolved by position.
+    :param resolve_mode: 'tap', 'cone' or 'tiled'.
+    :param radii: Radius schedule in arcsec.
+    :param parameters: Selection parameters, e.g. H_limit=9.
+    :return: Rows of the recovered sources (dict of lists, with 'selected' indices).
+    """
+    survey = SURVEYS[name]
+    if survey.failed_queries is None:
+        raise ValueError(f"{name} is resolved by name and has no failed queries file")
+    missing = [parameter for parameter in survey.parameters() if parameters.get(parameter) is None]
+    if missing:
+        raise ValueError(f"{name}: {', '.join(missing)} must be given")
+    parameters = {parameter: parameters[parameter] for parameter in survey.parameters()}
+    failed_path = os.path.join(base_path, survey.failed_queries)
+    if not os.path.exists(failed_path):
+        print(f"No failed queries file for {name} ({failed_path})")
+        return None
+    ra, dec, unparsed = read_failed_queries(failed_path)
+    print(f"{len(ra)} failed positions in {failed_path}")
+
+    radius = survey.radius.to_value(u.arcsec)
+    schedule = [radius] + sorted(r for r in radii if r > radius)
+    recovered = {field: [] for field in ('ra', 'dec', 'name') + BANDS}
+    METRICS.reset()
+    for radius in schedule:
+        if not ra:
+            break
+        with METRICS.stage(f"retry_{radius:g}arcsec"):
+            rows = resolve_sources({'ra': ra, 'dec': dec}, resolve_mode, survey.unit, radius, list(BANDS))
+        found = [i for i, simbad_id in enumerate(rows['name']) if simbad_id is not None]
+        print(f"Radius {radius:g}\": {len(found)}/{len(ra)} positions recovered")
+        for field in recovered:
+            recovered[field] += [rows[field][i] for i in found] if field in rows else [None] * len(found)
+        found = set(found)
+        ra = [value for i, value in enumerate(ra) if i not in found]
+        dec = [value for i, value in enumerate(dec) if i not in found]
+
+    # Magnitudes the cone searches did not bring back come from one batch query of the new names
+    if recovered['name']:
+        missing_bands = [band for band in BANDS if any(value is None for value in recovered[band])]
+        photometry = get_info(recovered['name'], *missing_bands, save_tsv=False) if missing_bands else {}
+        for band in missing_bands:
+            recovered[band] = [old if old is not None else new for old, new in zip(recovered[band], photometry[band])]
+    recovered = filter_sources(recovered, survey.selection, parameters)
+    output = os.path.join(base_path, survey.output)
+    merged = merge_sources(output, recovered, survey.delimiter)
+    print(f"{merged} recovered sources merged into '{os.path.basename(output)}'.")
+
+    # Lines that could not be read are kept as they were, for a look by hand
+    with open(failed_path, 'w') as file:
+        for ra_i, dec_i in zip(ra, dec):
+            file.write(f"{ra_i} {dec_i}\n")
+        file.writelines(f"{line}\n" for line in unparsed)
+    print(f"{len(ra)} positions still failing, saved to {failed_path}")
+    if unparsed:
+        print(f"⚠️ {len(unparsed)} unreadable lines kept in {failed_path}")
+    METRICS.write_report(f"retry_{name}")
+    return recovered
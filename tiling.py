@@ -0,0 +1,54 @@
+from collections import namedtuple
+import numpy as np
+from crossmatch import SkyIndex, chord_to_arcsec, radec_to_unit
+
+# One region query: center in degrees, radius in arcsec, indices of the targets it covers
+Tile = namedtuple('Tile', ['ra', 'dec', 'radius', 'members'])
+
+
+def plan_tiles(ra_deg, dec_deg, radius, max_tile_radius=180.):
+    """
+    Group targets into region queries by greedy clustering. The target with the most neighbours
+    within max_tile_radius - radius becomes the center of a tile holding all of those neighbours
+    not yet taken, and so on until every target is in a tile. Dense fields end up in a few large
+    tiles, isolated targets in tiles of their own (a plain cone search of `radius`).
+    :param ra_deg: Array of right ascensions in degrees.
+    :param dec_deg: Array of declinations in degrees.
+    :param radius: Match radius of a single target, in arcsec.
+    :param max_tile_radius: Largest region query, in arcsec.
+    :return: List of Tile, the densest first. Each target is in exactly one tile, whose radius
+        covers the target's whole match circle.
+    """
+    ra_deg = np.asarray(ra_deg, dtype=float)
+    dec_deg = np.asarray(dec_deg, dtype=float)
+    if len(ra_deg) == 0:
+        return []
+    neighbours = SkyIndex(ra_deg, dec_deg).within(ra_deg, dec_deg, max(max_tile_radius - radius, 0.))
+    points = radec_to_unit(ra_deg, dec_deg)
+    taken = np.zeros(len(ra_deg), dtype=bool)
+    tiles = []
+    for seed in np.argsort([-len(found) for found in neighbours], kind='stable'):
+        if taken[seed]:
+            continue
+        members = neighbours[seed][~taken[neighbours[seed]]]  # Always holds the seed itself
+        taken[members] = True
+        spread = chord_to_arcsec(np.linalg.norm(points[members] - points[seed], axis=1)).max()
+        tiles.append(Tile(float(ra_deg[seed]), float(dec_deg[seed]), float(spread + radius), np.sort(members)))
+    return tiles
+
+
+def assign_nearest(target_ra, target_dec, object_ra, object_dec, radius):
+    """
+    Nearest object of a region query for each of the tile's targets.
+    :param target_ra: Right ascensions of the targets, in degrees.
+    :param target_dec: Declinations of the targets, in degrees.
+    :param object_ra: Right ascensions of the objects returned, in degrees (NaN for unknown).
+    :param object_dec: Declinations of the objects returned, in degrees.
+    :param radius: Match radius in arcsec.
+    :return: Array of object indices, -1 where nothing is within the radius.
+    """
+    object_ra = np.asarray(object_ra, dtype=float)
+    object_dec = np.asarray(object_dec, dtype=float)
+    valid = np.flatnonzero(np.isfinite(object_ra) & np.isfinite(object_dec))
+    index, _ = SkyIndex(object_ra[valid], object_dec[valid]).nearest(target_ra, target_dec, radius)
+    return np.where(index >= 0, valid[np.maximum(index, 0)] if len(valid) else -1, -1)
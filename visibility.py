@@ -0,0 +1,71 @@
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord, AltAz, get_sun
+
+
+def target_coords(ra_deg, dec_deg):
+    """
+    One array SkyCoord for a whole target list.
+    :param ra_deg: Right ascensions in degrees.
+    :param dec_deg: Declinations in degrees.
+    :return: SkyCoord of shape (targets,).
+    """
+    return SkyCoord(np.asarray(ra_deg, dtype=float) * u.deg, np.asarray(dec_deg, dtype=float) * u.deg, frame='icrs')
+
+
+def altaz_grid(coords, times, location):
+    """
+    Transform every target to AltAz at every time in a single broadcast transform.
+    :param coords: SkyCoord of shape (targets,).
+    :param times: astropy Time of any shape, e.g. (times,) or (nights, samples).
+    :param location: EarthLocation of the site.
+    :return: AltAz SkyCoord of shape (targets,) + times.shape.
+    """
+    frame = AltAz(obstime=times, location=location)
+    return coords.reshape(coords.shape + (1,) * times.ndim).transform_to(frame)
+
+
+def airmass(alt):
+    """
+    Plane-parallel airmass sec(z), NaN for targets below the horizon.
+    :param alt: Altitude Quantity (any shape).
+    :return: Array of airmass values.
+    """
+    alt_deg = alt.to_value(u.deg)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(alt_deg > 0, 1. / np.sin(np.radians(alt_deg)), np.nan)
+
+
+def visibility(coords, times, location, min_altitude=0 * u.deg, max_airmass=None, max_sun_altitude=None):
+    """
+    Altitude, azimuth and airmass of every target at every time, plus visibility flags.
+    :param coords: SkyCoord of shape (targets,), see target_coords.
+    :param times: astropy Time array of shape (times,).
+    :param location: EarthLocation of the site.
+    :param min_altitude: A target counts as up above this altitude.
+    :param max_airmass: Optional airmass limit on top of min_altitude.
+    :param max_sun_altitude: Optional, only count times when the Sun is below this altitude
+        (e.g. -18 deg for astronomical night).
+    :return: Dictionary with
+        alt, az, airmass: (targets, times) arrays in degrees / sec(z),
+        up: (targets, times) boolean array of usable samples,
+        visible: (targets,) boolean, up at any of the times,
+        fraction: (targets,) fraction of the times the target is up.
+    """
+    altaz = altaz_grid(coords, times, location)
+    alt = altaz.alt
+    am = airmass(alt)
+
+    up = alt > min_altitude
+    if max_airmass is not None:
+        up &= am <= max_airmass
+    if max_sun_altitude is not None:
+        sun_alt = get_sun(times).transform_to(AltAz(obstime=times, location=location)).alt
+        up &= (sun_alt < max_sun_altitude)[np.newaxis, :]
+
+    return {'alt': alt.to_value(u.deg),
+            'az': altaz.az.to_value(u.deg),
+            'airmass': am,
+            'up': up,
+            'visible': up.any(axis=1),
+            'fraction': up.mean(axis=1)}
@@ -0,0 +1,141 @@
+import re
+import numpy as np
+from astropy.table import Table, MaskedColumn
+
+# "#Column	Jmag	(F7.4)	? J magnitude from VISTA	[ucd=phot.mag;em.IR.J]"
+_COLUMN_RE = re.compile(r'^#Column\t(?P<name>[^\t]+)\t\((?P<format>[A-Za-z])[0-9.]*\)\t(?P<description>[^\t]*)')
+
+SEXAGESIMAL_UNITS = {'"h:m:s"': 15., '"d:m:s"': 1.}
+
+
+def _split_sexagesimal(values):
+    # "05 29 23.361" / "-04:30:56.397" -> sign, first, minutes, seconds (string arrays)
+    values = np.char.strip(np.char.replace(values, ':', ' '))
+    sign = np.where(np.char.startswith(values, '-'), -1., 1.)
+    values = np.char.lstrip(values, '+-')
+    first = np.char.partition(values, ' ')
+    minutes = np.char.partition(np.char.lstrip(first[..., 2]), ' ')
+    return sign, first[..., 0], minutes[..., 0], np.char.strip(minutes[..., 2])
+
+
+def _to_float(values, empty='nan'):
+    return np.where(values == '', empty, values).astype(float)
+
+
+def sexagesimal_to_deg(values, hours=False):
+    """
+    Convert an array of sexagesimal strings ("05 29 23.361", "-04:30:56.4", "05 42") to degrees
+    in one pass over the array.
+    :param values: Array of strings. Blank entries are masked.
+    :param hours: True for h:m:s (right ascension), False for d:m:s.
+    :return: Masked float array in degrees.
+    """
+    values = np.asarray(values, dtype=str)
+    blank = np.char.strip(values) == ''
+    sign, first, minutes, seconds = _split_sexagesimal(np.where(blank, '0', values))
+    deg = sign * (_to_float(first) + _to_float(minutes, '0') / 60. + _to_float(seconds, '0') / 3600.)
+    return np.ma.masked_array(deg * (15. if hours else 1.), mask=blank)
+
+
+def _typed_column(values, fmt):
+    values = np.char.strip(np.asarray(values, dtype=str))
+    blank = values == ''
+    if fmt is not None and fmt in 'FfEeDd':
+        return np.ma.masked_array(_to_float(values), mask=blank)
+    if fmt is not None and fmt in 'Ii':
+        return np.ma.masked_array(np.where(blank, '0', values).astype(np.int64), mask=blank)
+    if fmt is None:
+        # No #Column description: use floats if every non-blank value parses as one
+        try:
+            return np.ma.masked_array(_to_float(values), mask=blank)
+        except ValueError:
+            pass
+    return np.ma.masked_array(values, mask=blank)
+
+
+def _iter_rows(tsvfile, formats, descriptions, header):
+    # Split data rows, filling formats/descriptions from the "#Column" lines and header with
+    # the names / units / dashes rows as they go by
+    for line in tsvfile:
+        if line.startswith('#'):
+            match = _COLUMN_RE.match(line)
+            if match:
+                formats[match['name']] = match['format']
+                descriptions[match['name']] = match['description'].strip()
+            continue
+        line = line.rstrip('\n')
+        if not line.strip():
+            continue
+        if len(header) < 3:
+            header.append(line.split('\t'))  # names, units, dashes
+        else:
+            yield line.split('\t')
+
+
+def _wanted_columns(header, columns, filepath):
+    names = header[0]
+    wanted = names if columns is None else columns
+    missing = [name for name in wanted if name not in names]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {filepath}")
+    return wanted
+
+
+def _build_table(rows, header, wanted, formats, descriptions, convert_sexagesimal):
+    names, units = header[0], header[1] if len(header) > 1 else [''] * len(header[0])
+    table = Table()
+    for name in wanted:
+        index = names.index(name)
+        values = [row[index] if index < len(row) else '' for row in rows]
+        unit = units[index].strip() if index < len(units) else ''
+        if convert_sexagesimal and unit in SEXAGESIMAL_UNITS:
+            data = sexagesimal_to_deg(values, hours=SEXAGESIMAL_UNITS[unit] == 15.)
+            column_unit = 'deg'
+        else:
+            data = _typed_column(values, formats.get(name))
+            column_unit = unit.strip('"') or None
+        table[name] = MaskedColumn(data, unit=column_unit, description=descriptions.get(name),
+                                   meta={'original_unit': unit, 'format': formats.get(name)})
+    return table
+
+
+def read_vizier_tsv(filepath, columns=None, convert_sexagesimal=True):
+    """
+    Read a VizieR ASU-TSV file in a single pass.
+    The name / unit / dash header rows give the column names and units, the "#Column" comment
+    lines give each column's format, used to type it (float, int or string, blanks masked).
+    :param filepath: Path to the .tsv file.
+    :param columns: Optional list of column names to keep. The others are not converted at all.
+    :param convert_sexagesimal: Convert "h:m:s" and "d:m:s" columns to degrees (unit 'deg').
+    :return: astropy Table. Column descriptions and the original units are in column.meta.
+    """
+    formats, descriptions, header = {}, {}, []
+    with open(filepath, 'r') as tsvfile:
+        rows = list(_iter_rows(tsvfile, formats, descriptions, header))
+    wanted = _wanted_columns(header, columns, filepath)
+    return _build_table(rows, header, wanted, formats, descriptions, convert_sexagesimal)
+
+
+def iter_vizier_tsv(filepath, columns=None, batch_size=10000, convert_sexagesimal=True):
+    """
+    Read a VizieR ASU-TSV file lazily, `batch_size` rows at a time, so that memory does not grow
+    with the file. Each batch is typed like read_vizier_tsv does it.
+    :param filepath: Path to the .tsv file.
+    :param columns: Optional list of column names to keep.
+    :param batch_size: Number of rows per table.
+    :param convert_sexagesimal: Convert "h:m:s" and "d:m:s" columns to degrees (unit 'deg').
+    :return: Generator of astropy Tables.
+    """
+    formats, descriptions, header = {}, {}, []
+    wanted = None
+    batch = []
+    with open(filepath, 'r') as tsvfile:
+        for row in _iter_rows(tsvfile, formats, descriptions, header):
+            if wanted is None:
+                wanted = _wanted_columns(header, columns, filepath)
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield _build_table(batch, header, wanted, formats, descriptions, convert_sexagesimal)
+                batch = []
+    if batch:
+        yield _build_table(batch, header, wanted, formats, descriptions, convert_sexagesimal)